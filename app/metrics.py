@@ -0,0 +1,146 @@
+# 文件：app/metrics.py
+#
+# 集中定義 Prometheus 指標，讓 run.py、models、services 共用同一組 collector。
+# label 只使用固定集合（symbol、route 規則、操作名稱、結果），避免 cardinality 失控。
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# --- 價格抓取 / 推送 ---
+PRICE_SUCCESS = Counter(
+    'price_fetch_success_total',
+    '價格抓取成功次數',
+    ['symbol']
+)
+PRICE_FAILURE = Counter(
+    'price_fetch_failure_total',
+    '價格抓取失敗次數',
+    ['symbol']
+)
+PRICE_DURATION = Histogram(
+    'price_fetch_duration_seconds',
+    '價格抓取耗時 (秒)',
+    ['symbol']
+)
+PRICE_EMIT = Counter(
+    'price_emit_total',
+    '推送價格更新次數',
+    ['symbol']
+)
+
+# --- 價格來源 (provider) ---
+PRICE_SOURCE_REQUESTS = Counter(
+    'price_source_requests_total',
+    '各價格來源請求結果',
+    ['source', 'result']
+)
+PRICE_SOURCE_LATENCY = Histogram(
+    'price_source_latency_seconds',
+    '各價格來源回應耗時 (秒)',
+    ['source'],
+    buckets=(.05, .1, .25, .5, 1, 2, 3, 5)
+)
+PRICE_SOURCE_BREAKER = Gauge(
+    'price_source_breaker_state',
+    '價格來源 circuit breaker 狀態 (0=closed, 1=half_open, 2=open)',
+    ['source']
+)
+
+# --- 資料庫 ---
+# operation 為程式內寫死的名稱（save_price、list_notes ...），不含 SQL 或參數
+DB_DURATION = Histogram(
+    'db_operation_duration_seconds',
+    '資料庫操作耗時 (秒)',
+    ['operation'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+
+# --- HTTP ---
+# route 使用 Flask 的 url_rule（例如 /api/notes/<int:note_id>），而非實際路徑
+HTTP_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'HTTP 請求耗時 (秒)',
+    ['method', 'route', 'status']
+)
+
+# endpoint 為快取名稱（trades、notes、config、news），result 為 hit / miss / not_modified
+RESPONSE_CACHE_TOTAL = Counter(
+    'http_response_cache_total',
+    'API 回應快取結果',
+    ['endpoint', 'result']
+)
+
+# --- Socket.IO ---
+SOCKET_CLIENTS = Gauge(
+    'socketio_connected_clients',
+    '目前連線中的 Socket.IO client 數'
+)
+SOCKET_EMIT_DURATION = Histogram(
+    'socketio_emit_duration_seconds',
+    'Socket.IO 廣播 (fan-out) 耗時 (秒)',
+    ['event'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+)
+
+# --- 多 worker 訊息佇列 ---
+BUS_QUEUE_DEPTH = Gauge(
+    'cluster_bus_queue_depth',
+    '已從 Redis 收到、等待分派給本地訂閱者的 bus 訊息數'
+)
+BUS_DELIVERY_LAG = Histogram(
+    'cluster_bus_delivery_lag_seconds',
+    'bus 訊息從發布到本地訂閱者開始處理的延遲 (秒，跨主機時含時鐘誤差)',
+    ['channel'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+CLUSTER_LEADER = Gauge(
+    'cluster_is_leader',
+    '本 process 是否為 leader (1/0)'
+)
+
+# --- Email 通知 ---
+EMAIL_SEND_DURATION = Histogram(
+    'email_send_duration_seconds',
+    'Email 發送耗時 (秒)',
+    buckets=(.1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+EMAIL_SEND_TOTAL = Counter(
+    'email_send_total',
+    'Email 發送次數',
+    ['result']
+)
+
+# --- 背景任務 ---
+JOB_DURATION = Histogram(
+    'background_job_duration_seconds',
+    '背景任務單次執行耗時 (秒)',
+    ['job'],
+    buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+)
+JOB_LAST_SUCCESS = Gauge(
+    'background_job_last_success_timestamp_seconds',
+    '背景任務最近一次成功的 Unix 時間',
+    ['job']
+)
+
+# --- Binance 交易同步 ---
+SYNC_TOTAL = Counter(
+    'trade_sync_total',
+    '交易同步次數',
+    ['result']
+)
+SYNC_TRADES_FETCHED = Counter(
+    'trade_sync_trades_fetched_total',
+    '交易同步抓到的成交筆數'
+)
+
+# --- 新聞抓取 ---
+NEWS_FETCH_TOTAL = Counter(
+    'news_fetch_total',
+    '新聞抓取結果',
+    ['category', 'result']
+)
+NEWS_FETCH_DURATION = Histogram(
+    'news_fetch_duration_seconds',
+    '新聞 API 呼叫耗時 (秒)',
+    ['category']
+)
@@ -3,6 +3,9 @@ import logging
 from datetime import datetime
 from pathlib import Path
 
+from app.metrics import DB_DURATION
+from app.models.storage import DATABASE_URL, SQLiteBackend, create_backend
+
 # ---- 路徑設定 ----
 # 新資料庫位置：使用者家目錄下的隱藏資料夾
 DATA_DIR = Path.home() / ".crypto_alert_system"
@@ -12,13 +15,100 @@ DB_PATH = str(DATA_DIR / "price_history.db")
 # 舊的資料庫（遺留在原程式碼目錄下）
 OLD_DB_PATH = Path(__file__).parent / "price_history.db"
 
+# 儲存後端：設定 DATABASE_URL=postgresql://... 時改用 PostgreSQL
+backend = create_backend(DATABASE_URL, DB_PATH)
+
+
+def get_backend(db_path: str = None):
+    """指定 db_path 時使用該 SQLite 檔（回測 / 歸檔的離線用途），否則使用全域後端"""
+    return SQLiteBackend(db_path) if db_path else backend
+
+# PostgreSQL 版 schema，欄位與 SQLite 版一一對應；時間欄位一律存 UTC
+PG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS trade_history (
+      id               BIGSERIAL PRIMARY KEY,
+      trade_id         BIGINT  NOT NULL UNIQUE,
+      order_id         BIGINT  NOT NULL,
+      symbol           TEXT    NOT NULL,
+      side             TEXT    NOT NULL,
+      price            DOUBLE PRECISION NOT NULL,
+      quantity         DOUBLE PRECISION NOT NULL,
+      commission       DOUBLE PRECISION NOT NULL,
+      commission_asset TEXT    NOT NULL,
+      quote_qty        DOUBLE PRECISION NOT NULL,
+      is_maker         INTEGER NOT NULL,
+      trade_time       TIMESTAMP NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS notes (
+      id          BIGSERIAL PRIMARY KEY,
+      title       TEXT    NOT NULL,
+      code        TEXT    NOT NULL,
+      explanation TEXT,
+      purpose     TEXT,
+      result      TEXT,
+      created_at  TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+      updated_at  TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+      version     INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS note_images (
+      note_id BIGINT NOT NULL,
+      image   TEXT   NOT NULL,
+      PRIMARY KEY (note_id, image)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_note_images_image ON note_images (image)",
+    """
+    CREATE TABLE IF NOT EXISTS price_history (
+      id        BIGSERIAL PRIMARY KEY,
+      symbol    TEXT    NOT NULL,
+      price     DOUBLE PRECISION NOT NULL,
+      timestamp TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_price_history_symbol ON price_history (symbol, id)",
+    "CREATE INDEX IF NOT EXISTS idx_price_history_timestamp ON price_history (timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS alert_state (
+      symbol     TEXT    PRIMARY KEY,
+      high_sent  INTEGER NOT NULL DEFAULT 0,
+      low_sent   INTEGER NOT NULL DEFAULT 0,
+      updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+    )
+    """,
+]
+
 
 def init_db():
     """
-    1) 在新路徑建立資料夾和資料庫
+    1) 在新路徑建立資料夾和資料庫（或 PostgreSQL schema）
     2) 建立三張表（trade_history、notes、price_history）
     3) 如果找到舊 DB，就把 notes 表的資料搬過來
+    4) 補上 notes.version 欄位與 note_images 圖片索引（首次建立時回填）
     """
+    if backend.dialect == "postgres":
+        needs_image_backfill = _init_postgres()
+    else:
+        needs_image_backfill = _init_sqlite()
+
+    if needs_image_backfill:
+        from app.models.notes import rebuild_image_index
+        rebuild_image_index()
+
+
+def _init_postgres() -> bool:
+    with backend.connect() as conn:
+        needs_image_backfill = not backend.table_exists(conn, "note_images")
+        for ddl in PG_SCHEMA:
+            backend.execute(conn, ddl)
+    return needs_image_backfill
+
+
+def _init_sqlite() -> bool:
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
@@ -55,6 +145,24 @@ def init_db():
     )
     """)
 
+    # notes 版本號（樂觀並行控制用），舊資料庫補欄位
+    note_cols = [r[1] for r in cursor.execute("PRAGMA table_info(notes)")]
+    if "version" not in note_cols:
+        cursor.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    # 筆記引用的圖片索引，刪除 / 孤兒圖片判斷不必再掃描所有筆記內容
+    needs_image_backfill = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_images'"
+    ).fetchone() is None
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS note_images (
+        note_id INTEGER NOT NULL,
+        image   TEXT    NOT NULL,
+        PRIMARY KEY (note_id, image)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_images_image ON note_images (image)")
+
     # 建立價格歷史表
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS price_history (
@@ -65,6 +173,16 @@ def init_db():
     )
     """)
 
+    # 建立警報狀態表（多 worker 共用，避免重複發信）
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alert_state (
+        symbol     TEXT    PRIMARY KEY,
+        high_sent  INTEGER NOT NULL DEFAULT 0,
+        low_sent   INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
     conn.commit()
 
     # 如果舊資料庫存在，就附加並把 notes 資料搬過來
@@ -87,45 +205,113 @@ def init_db():
             conn.execute("DETACH DATABASE old_db")
 
     conn.close()
+    return needs_image_backfill
 
 
-def save_trade(trade: dict):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    try:
-        c.execute("""
-          INSERT INTO trade_history (
-            trade_id, order_id, symbol, side,
-            price, quantity, commission,
-            commission_asset, quote_qty,
-            is_maker, trade_time
-          ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-          trade["id"],
-          trade["orderId"],
-          trade["symbol"],
-          "BUY" if trade.get("isBuyer") else "SELL",
-          float(trade.get("price", 0)),
-          float(trade.get("qty", 0)),
-          float(trade.get("commission", 0)),
-          trade.get("commissionAsset", ""),
-          float(trade.get("quoteQty", 0)),
-          1 if trade.get("isMaker") else 0,
-          datetime.fromtimestamp(trade.get("time", 0)/1000).isoformat(sep=' ')
-        ))
-    except sqlite3.IntegrityError:
-        pass
-    conn.commit()
-    conn.close()
+_INSERT_TRADE = """
+  INSERT INTO trade_history (
+    trade_id, order_id, symbol, side,
+    price, quantity, commission,
+    commission_asset, quote_qty,
+    is_maker, trade_time
+  ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+  ON CONFLICT (trade_id) DO NOTHING
+"""
 
 
-def save_price(symbol: str, price: float):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO price_history (symbol, price) VALUES (?, ?)",
-        (symbol, price)
+def _trade_row(trade: dict) -> tuple:
+    return (
+        trade["id"],
+        trade["orderId"],
+        trade["symbol"],
+        "BUY" if trade.get("isBuyer") else "SELL",
+        float(trade.get("price", 0)),
+        float(trade.get("qty", 0)),
+        float(trade.get("commission", 0)),
+        trade.get("commissionAsset", ""),
+        float(trade.get("quoteQty", 0)),
+        1 if trade.get("isMaker") else 0,
+        datetime.fromtimestamp(trade.get("time", 0)/1000).isoformat(sep=' ')
     )
-    conn.commit()
-    conn.close()
+
+
+def save_trade(trade: dict):
+    with DB_DURATION.labels(operation="save_trade").time():
+        with backend.connect() as conn:
+            backend.execute(conn, _INSERT_TRADE, _trade_row(trade))
+
+
+def save_trades(trades: list):
+    """整批成交在同一個連線 / 交易內寫入，已存在的 trade_id 直接略過"""
+    with DB_DURATION.labels(operation="save_trades").time():
+        with backend.connect() as conn:
+            backend.executemany(conn, _INSERT_TRADE, [_trade_row(t) for t in trades])
+
+
+def save_price(symbol: str, price: float) -> int:
+    """寫入一筆價格，回傳 price_history.id（供記憶體視窗判斷該筆是否已在暖機資料中）"""
+    with DB_DURATION.labels(operation="save_price").time():
+        with backend.connect() as conn:
+            row_id = backend.insert_id(
+                conn,
+                "INSERT INTO price_history (symbol, price) VALUES (?, ?)",
+                (symbol, price)
+            )
     logging.info(f"{symbol} saved at {price}")
+    return row_id
+
+
+def save_prices(rows):
+    """
+    批次寫入 (symbol, price, timestamp) 多筆價格，timestamp 為 UTC 'YYYY-MM-DD HH:MM:SS'。
+    PostgreSQL 使用 COPY，SQLite 使用 executemany。
+    """
+    with DB_DURATION.labels(operation="save_prices").time():
+        with backend.connect() as conn:
+            backend.bulk_insert(conn, "price_history", ("symbol", "price", "timestamp"), rows)
+
+
+def claim_alert(symbol: str, side: str) -> bool:
+    """
+    嘗試取得 symbol 的 high / low 警報發送權。
+    以條件式 UPDATE 原子地切換旗標（high 與 low 互斥），
+    只有真正把旗標從 0 改成 1 的呼叫者會拿到 True，
+    因此即使有多個 process 同時判斷，也只會有一個寄出 Email。
+    """
+    if side not in ("high", "low"):
+        raise ValueError(f"未知的警報方向: {side}")
+    other = "low" if side == "high" else "high"
+
+    with DB_DURATION.labels(operation="claim_alert").time():
+        return _claim_alert(symbol, side, other)
+
+
+def _claim_alert(symbol: str, side: str, other: str) -> bool:
+    with backend.connect() as conn:
+        backend.execute(
+            conn,
+            "INSERT INTO alert_state (symbol) VALUES (?) ON CONFLICT (symbol) DO NOTHING",
+            (symbol,)
+        )
+        cur = backend.execute(conn, f"""
+            UPDATE alert_state
+            SET {side}_sent = 1, {other}_sent = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE symbol = ? AND {side}_sent = 0
+        """, (symbol,))
+        return cur.rowcount == 1
+
+
+def load_recent_prices(symbol: str, limit: int) -> list:
+    """回傳 symbol 最近 limit 筆 (id, Unix 秒, price)，依時間由舊到新"""
+    with DB_DURATION.labels(operation="load_recent_prices").time():
+        with backend.connect() as conn:
+            rows = backend.execute(
+                conn,
+                f"""
+                SELECT id, {backend.epoch("timestamp")}, price
+                FROM price_history WHERE symbol = ? ORDER BY id DESC LIMIT ?
+                """,
+                (symbol, limit)
+            ).fetchall()
+    rows.reverse()
+    return rows
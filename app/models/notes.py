@@ -1,12 +1,12 @@
 import os
 import re
-import sqlite3
 from datetime import datetime
 from pathlib import Path
 from typing import Dict
 import logging
 
-from .database import DB_PATH
+from .database import backend
+from app.metrics import DB_DURATION
 
 # 初始化 logger
 logger = logging.getLogger(__name__)
@@ -23,84 +23,138 @@ def extract_used_images(html: str):
     return [Path(src).name for src in IMG_TAG_RE.findall(html or "") if "/images/" in src]
 
 
-def save_note(data: Dict):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+class NoteConflict(Exception):
+    """更新時帶的 version 與資料庫不符（其他分頁已先儲存）"""
 
+    def __init__(self, note_id: int, current_version: int):
+        super().__init__(f"筆記 {note_id} 已被修改（目前版本 {current_version}）")
+        self.note_id = note_id
+        self.current_version = current_version
+
+
+def _index_images(conn, note_id: int, images):
+    backend.execute(conn, "DELETE FROM note_images WHERE note_id = ?", (note_id,))
+    backend.executemany(
+        conn,
+        "INSERT INTO note_images (note_id, image) VALUES (?, ?) "
+        "ON CONFLICT (note_id, image) DO NOTHING",
+        [(note_id, img) for img in images]
+    )
+
+
+def rebuild_image_index():
+    """以所有筆記內容重建 note_images（僅在索引表首次建立時需要）"""
+    with backend.transaction() as conn:
+        backend.execute(conn, "DELETE FROM note_images")
+        for note_id, code in backend.execute(conn, "SELECT id, code FROM notes").fetchall():
+            _index_images(conn, note_id, set(extract_used_images(code)))
+    logger.info("[notes] 已重建圖片索引")
+
+
+def save_note(data: Dict) -> Dict:
+    with DB_DURATION.labels(operation="save_note").time():
+        return _save_note(data)
+
+
+def _save_note(data: Dict) -> Dict:
+    """
+    新增或更新筆記，回傳 {"id", "version"}。
+    更新時必須帶讀到的 version，只有版本相符才會寫入，否則丟出 NoteConflict；
+    未帶 version 丟出 ValueError（不允許無條件覆寫）。
+    """
     now = datetime.now().isoformat(sep=' ')
     code_html = data.get("code", "")
-    used_images = extract_used_images(code_html)
-
-    if data.get("id"):
-        # === 更新筆記 ===
-        cursor.execute("SELECT code FROM notes WHERE id = ?", (data["id"],))
-        old_row = cursor.fetchone()
-        old_images = extract_used_images(old_row[0]) if old_row else []
-
-        cursor.execute("""
-            UPDATE notes
-            SET title = ?, code = ?, purpose = ?, result = ?, updated_at = ?
-            WHERE id = ?
-        """, (
-            data["title"],
-            code_html,
-            data.get("purpose", ""),
-            data.get("result", ""),
-            now,
-            data["id"]
-        ))
-        note_id = data["id"]
-
-        # === 刪除未使用圖片（暫時註解以避免新貼圖誤刪） ===
-        # for img in set(old_images) - set(used_images):
-        #     try:
-        #         img_path = IMAGE_DIR / img
-        #         if img_path.exists():
-        #             logger.info(f"[save_note] 刪除未用圖片: {img_path}")
-        #             img_path.unlink()
-        #     except Exception as e:
-        #         logger.error(f"[save_note] 刪除圖片失敗: {e}")
-    else:
-        # === 新增筆記 ===
-        cursor.execute("""
-            INSERT INTO notes (title, code, purpose, result, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            data["title"],
-            code_html,
-            data.get("purpose", ""),
-            data.get("result", ""),
-            now,
-            now
-        ))
-        note_id = cursor.lastrowid
-
-    conn.commit()
-    conn.close()
-    logger.info(f"[save_note] 筆記儲存完成 ID={note_id}")
-    return note_id
+    used_images = set(extract_used_images(code_html))
+
+    # SQLite 以 BEGIN IMMEDIATE 先取得寫鎖，寫入者依 timeout 排隊而不是讀到一半才衝突；
+    # PostgreSQL 則由條件式 UPDATE 的列鎖保證同一版本只有一個寫入者成功
+    with backend.transaction() as conn:
+        if data.get("id"):
+            # === 更新筆記 ===
+            note_id = int(data["id"])
+            expected = data.get("version")
+            if expected is None:
+                raise ValueError("更新筆記必須帶入 version")
+            params = [
+                data["title"],
+                code_html,
+                data.get("purpose", ""),
+                data.get("result", ""),
+                now,
+                note_id,
+                int(expected)
+            ]
+            cursor = backend.execute(conn, """
+                UPDATE notes
+                SET title = ?, code = ?, purpose = ?, result = ?, updated_at = ?,
+                    version = version + 1
+                WHERE id = ? AND version = ?
+            """, params)
+
+            if cursor.rowcount == 0:
+                row = backend.execute(
+                    conn, "SELECT version FROM notes WHERE id = ?", (note_id,)
+                ).fetchone()
+                if row is not None:
+                    raise NoteConflict(note_id, row[0])
+                raise LookupError(f"筆記 {note_id} 不存在")
+
+            # 未使用的圖片不在這裡刪除（新貼上的圖片可能尚未存入筆記），
+            # 需要清理時改用 find_orphan_images()
+        else:
+            # === 新增筆記 ===
+            note_id = backend.insert_id(conn, """
+                INSERT INTO notes (title, code, purpose, result, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                data["title"],
+                code_html,
+                data.get("purpose", ""),
+                data.get("result", ""),
+                now,
+                now
+            ))
+
+        _index_images(conn, note_id, used_images)
+        version = backend.execute(
+            conn, "SELECT version FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()[0]
+
+    logger.info(f"[save_note] 筆記儲存完成 ID={note_id} v{version}")
+    return {"id": note_id, "version": version}
 
 
 def delete_note(note_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # 查圖片並刪除
-    cursor.execute("SELECT code FROM notes WHERE id = ?", (note_id,))
-    row = cursor.fetchone()
-    if row:
-        images = extract_used_images(row[0])
-        for img in images:
-            try:
-                img_path = IMAGE_DIR / img
-                if img_path.exists():
-                    logger.info(f"[delete_note] 刪除圖片: {img_path}")
-                    img_path.unlink()
-            except Exception as e:
-                logger.error(f"[delete_note] 刪除圖片失敗: {e}")
-
-    # 刪除筆記資料
-    cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    conn.commit()
-    conn.close()
+    with DB_DURATION.labels(operation="delete_note").time():
+        _delete_note(note_id)
+
+
+def _delete_note(note_id: int):
+    with backend.transaction() as conn:
+        # 只刪除沒有其他筆記引用的圖片
+        images = [r[0] for r in backend.execute(conn, """
+            SELECT image FROM note_images
+            WHERE note_id = ?
+              AND image NOT IN (SELECT image FROM note_images WHERE note_id != ?)
+        """, (note_id, note_id)).fetchall()]
+        backend.execute(conn, "DELETE FROM note_images WHERE note_id = ?", (note_id,))
+        backend.execute(conn, "DELETE FROM notes WHERE id = ?", (note_id,))
+
+    # 檔案刪除放在交易提交之後，交易失敗時不會誤刪
+    for img in images:
+        try:
+            img_path = IMAGE_DIR / img
+            if img_path.exists():
+                logger.info(f"[delete_note] 刪除圖片: {img_path}")
+                img_path.unlink()
+        except Exception as e:
+            logger.error(f"[delete_note] 刪除圖片失敗: {e}")
+
     logger.info(f"[delete_note] 筆記刪除完成 ID={note_id}")
+
+
+def find_orphan_images():
+    """回傳 IMAGE_DIR 中沒有任何筆記引用的圖片檔名（只查索引，不解析筆記內容）"""
+    with backend.connect() as conn:
+        used = {r[0] for r in backend.execute(conn, "SELECT DISTINCT image FROM note_images")}
+    return sorted(p.name for p in IMAGE_DIR.iterdir() if p.is_file() and p.name not in used)
@@ -0,0 +1,237 @@
+# 文件：app/models/storage.py
+#
+# 儲存後端抽象層：同一套 SQL（以 ? 當參數佔位符）可跑在 SQLite 或 PostgreSQL。
+#   - 未設定 DATABASE_URL：使用 SQLite（~/.crypto_alert_system/price_history.db）
+#   - DATABASE_URL=postgresql://...：使用 psycopg2 連線池
+# 方言差異（時間轉換、RETURNING、串流游標、批次寫入）集中在各 backend 的方法裡。
+
+import io
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "30"))   # 等待空閒連線的上限 (秒)
+
+
+class SQLiteBackend:
+    dialect = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def connect(self):
+        """一般讀寫：離開 with 時 commit，例外時 rollback"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """寫入交易：BEGIN IMMEDIATE 先取得寫鎖，多個寫入者依 timeout 排隊"""
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def sql(self, query: str) -> str:
+        return query
+
+    def execute(self, conn, query: str, params: Sequence = ()):
+        return conn.execute(query, params)
+
+    def executemany(self, conn, query: str, rows: Iterable[Sequence]):
+        return conn.executemany(query, rows)
+
+    def insert_id(self, conn, query: str, params: Sequence = ()) -> int:
+        return conn.execute(query, params).lastrowid
+
+    def fetchall(self, cursor) -> List[tuple]:
+        return cursor.fetchall()
+
+    def fetch_dicts(self, cursor) -> List[dict]:
+        cols = [d[0] for d in cursor.description]
+        return [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+    def stream(self, query: str, params: Sequence = (), chunk_size: int = 10000) -> Iterator[List[tuple]]:
+        """分批讀取大量資料，每次 yield 一批 rows"""
+        with self.connect() as conn:
+            cur = conn.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    def bulk_insert(self, conn, table: str, columns: Sequence[str], rows: Iterable[Sequence]):
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+        )
+
+    def epoch(self, column: str) -> str:
+        return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+    def month(self, column: str) -> str:
+        return f"strftime('%Y-%m', {column})"
+
+    def table_exists(self, conn, table: str) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    def column_exists(self, conn, table: str, column: str) -> bool:
+        return column in [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+class PostgresBackend:
+    dialect = "postgres"
+
+    def __init__(self, dsn: str, minconn: int = PG_POOL_MIN, maxconn: int = PG_POOL_MAX,
+                 timeout: float = PG_POOL_TIMEOUT):
+        import psycopg2  # 只有使用 PostgreSQL 時才需要
+        from psycopg2.pool import ThreadedConnectionPool
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        self.timeout = timeout
+        self.pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        # ThreadedConnectionPool 用完時直接丟 PoolError，不會等待；
+        # 以 semaphore 限制同時借出的連線數，超過時排隊等到 timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @contextmanager
+    def connect(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise self._psycopg2.pool.PoolError(
+                f"等待 PostgreSQL 連線逾時（{self.timeout:g} 秒，連線池上限 {self.pool.maxconn}）"
+            )
+        broken = False
+        try:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception as e:
+                    # rollback 失敗代表連線已壞，保留原本的例外往上拋
+                    logger.warning(f"[storage] rollback 失敗，捨棄連線: {e}")
+                    broken = True
+                raise
+            finally:
+                self.pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    # PostgreSQL 的交易本身即可提供所需隔離（搭配條件式 UPDATE），不需額外鎖
+    transaction = connect
+
+    def sql(self, query: str) -> str:
+        # psycopg2 使用 %s 佔位符，原本的 % 需跳脫
+        return query.replace("%", "%%").replace("?", "%s")
+
+    def execute(self, conn, query: str, params: Sequence = ()):
+        cur = conn.cursor()
+        cur.execute(self.sql(query), tuple(params))
+        return cur
+
+    def executemany(self, conn, query: str, rows: Iterable[Sequence]):
+        # execute_batch 把多筆語句合併送出，避免 executemany 每列一次往返
+        from psycopg2.extras import execute_batch
+        cur = conn.cursor()
+        execute_batch(cur, self.sql(query), list(rows), page_size=1000)
+        return cur
+
+    def insert_id(self, conn, query: str, params: Sequence = ()) -> int:
+        cur = self.execute(conn, query + " RETURNING id", params)
+        return cur.fetchone()[0]
+
+    @staticmethod
+    def _plain(value):
+        # 與 SQLite 存的字串格式一致，API 輸出不因後端不同而改變
+        if isinstance(value, datetime):
+            return value.isoformat(sep=" ")
+        return value
+
+    def fetchall(self, cursor) -> List[tuple]:
+        return [tuple(self._plain(v) for v in row) for row in cursor.fetchall()]
+
+    def fetch_dicts(self, cursor) -> List[dict]:
+        cols = [d[0] for d in cursor.description]
+        return [dict(zip(cols, (self._plain(v) for v in row))) for row in cursor.fetchall()]
+
+    def stream(self, query: str, params: Sequence = (), chunk_size: int = 10000) -> Iterator[List[tuple]]:
+        # 具名（server-side）游標：資料留在伺服器端，每次只取 chunk_size 筆
+        with self.connect() as conn:
+            with conn.cursor(name="stream_cursor") as cur:
+                cur.itersize = chunk_size
+                cur.execute(self.sql(query), tuple(params))
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    @staticmethod
+    def _copy_value(value) -> str:
+        if value is None:
+            return "\\N"
+        if isinstance(value, datetime):
+            value = value.isoformat(sep=" ")
+        return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r"))
+
+    def bulk_insert(self, conn, table: str, columns: Sequence[str], rows: Iterable[Sequence]):
+        """以 COPY FROM STDIN（text 格式）批次寫入"""
+        buf = io.StringIO()
+        for row in rows:
+            buf.write("\t".join(self._copy_value(v) for v in row))
+            buf.write("\n")
+        buf.seek(0)
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+    def epoch(self, column: str) -> str:
+        return f"CAST(EXTRACT(EPOCH FROM {column}) AS BIGINT)"
+
+    def month(self, column: str) -> str:
+        return f"to_char({column}, 'YYYY-MM')"
+
+    def table_exists(self, conn, table: str) -> bool:
+        return self.execute(conn, "SELECT to_regclass(?) IS NOT NULL", (table,)).fetchone()[0]
+
+    def column_exists(self, conn, table: str, column: str) -> bool:
+        return self.execute(conn, """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = ? AND column_name = ?
+        """, (table, column)).fetchone() is not None
+
+
+def create_backend(url: str, sqlite_path: str):
+    if url.startswith(("postgres://", "postgresql://")):
+        logger.info("[storage] 使用 PostgreSQL 後端")
+        return PostgresBackend(url)
+    return SQLiteBackend(sqlite_path)
@@ -0,0 +1,181 @@
+# 文件：app/services/archive.py
+#
+# 歷史資料歸檔：把 price_history / trade_history 以串流分批方式寫成 Parquet，
+# 依 symbol 與月份分區（hive 格式：symbol=cardano/month=2025-01/part-*.parquet）。
+# 過期價格先歸檔再刪除；長區間查詢可透過 read_prices 以 memory-map 讀取歸檔。
+# price_history 已歸檔的最大 id 記在 _state.json：線上查詢只取更新的列，刪除失敗也不會重複計算。
+
+import os
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from app.models.database import DATA_DIR, get_backend
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = DATA_DIR / "archive"
+PRICE_DIR = ARCHIVE_DIR / "price_history"
+PRICE_STATE = PRICE_DIR / "_state.json"
+TRADE_DIR = ARCHIVE_DIR / "trade_history"
+TRADE_STATE = TRADE_DIR / "_state.json"
+CHUNK_SIZE = 50_000
+
+PRICE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("symbol", pa.string()),
+    ("month", pa.string()),
+    ("ts", pa.int64()),
+    ("price", pa.float64()),
+])
+
+TRADE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("trade_id", pa.int64()),
+    ("order_id", pa.int64()),
+    ("symbol", pa.string()),
+    ("month", pa.string()),
+    ("side", pa.string()),
+    ("price", pa.float64()),
+    ("quantity", pa.float64()),
+    ("commission", pa.float64()),
+    ("commission_asset", pa.string()),
+    ("quote_qty", pa.float64()),
+    ("is_maker", pa.int64()),
+    ("ts", pa.int64()),
+])
+
+_PARTITIONING = ds.partitioning(
+    pa.schema([("symbol", pa.string()), ("month", pa.string())]), flavor="hive"
+)
+
+
+def _to_epoch(value: Optional[str]) -> Optional[int]:
+    """'YYYY-MM-DD[ HH:MM:SS]'（UTC，與 SQLite CURRENT_TIMESTAMP 相同）轉 Unix 秒"""
+    if not value:
+        return None
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _has_parquet(base_dir) -> bool:
+    return base_dir.exists() and any(base_dir.rglob("*.parquet"))
+
+
+def _write_state(path, last_id: int):
+    """先寫暫存檔再 rename，其他 worker 不會讀到寫一半的狀態檔"""
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"last_id": last_id}))
+    os.replace(tmp, path)
+
+
+def archived_price_id() -> int:
+    """已歸檔的最大 price_history id（0 表示尚未歸檔）；id 不大於它的列以歸檔為準"""
+    if PRICE_STATE.exists():
+        return json.loads(PRICE_STATE.read_text()).get("last_id", 0)
+    if not _has_parquet(PRICE_DIR):
+        return 0
+    # 舊版歸檔沒有狀態檔：從 Parquet 的 id 欄補算一次
+    ids = pq.read_table(str(PRICE_DIR), columns=["id"], partitioning=_PARTITIONING).column("id")
+    last_id = int(ids.to_numpy().max()) if len(ids) else 0
+    _write_state(PRICE_STATE, last_id)
+    return last_id
+
+
+def _write_chunk(rows, schema, base_dir, tag: str):
+    """把一批 tuple 轉為欄式 table 後依 symbol / month 分區寫出"""
+    columns = list(zip(*rows))
+    table = pa.Table.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+        schema=schema
+    )
+    ds.write_dataset(
+        table,
+        base_dir=str(base_dir),
+        format="parquet",
+        partitioning=_PARTITIONING,
+        # 檔名以該批第一個 id 命名，重跑同一批時會覆寫而不是重複
+        basename_template=f"part-{tag}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def archive_prices(cutoff: str, chunk_size: int = CHUNK_SIZE,
+                   db_path: str = None) -> Tuple[int, int]:
+    """
+    將上次歸檔之後、timestamp < cutoff 的 price_history 分批寫成 Parquet。
+    回傳 (本次歸檔筆數, 已歸檔的最大 id)；呼叫端只應刪除 id <= 最大 id 的列。
+    """
+    last_id = archived_price_id()
+    store = get_backend(db_path)
+    archived = 0
+    for rows in store.stream(f"""
+            SELECT id, symbol, {store.month("timestamp")},
+                   {store.epoch("timestamp")}, price
+            FROM price_history
+            WHERE timestamp < ? AND id > ?
+            ORDER BY id
+        """, (cutoff, last_id), chunk_size):
+        _write_chunk(rows, PRICE_SCHEMA, PRICE_DIR, str(rows[0][0]))
+        archived += len(rows)
+        last_id = rows[-1][0]
+        _write_state(PRICE_STATE, last_id)
+    if archived:
+        logger.info(f"[archive] 已歸檔 {archived} 筆 price_history（id <= {last_id}）")
+    return archived, last_id
+
+
+def archive_trades(chunk_size: int = CHUNK_SIZE, db_path: str = None) -> int:
+    """將上次歸檔之後新增的 trade_history 匯出為 Parquet（不刪除原資料）"""
+    last_id = 0
+    if TRADE_STATE.exists():
+        last_id = json.loads(TRADE_STATE.read_text()).get("last_id", 0)
+
+    store = get_backend(db_path)
+    exported = 0
+    for rows in store.stream(f"""
+            SELECT id, trade_id, order_id, symbol, {store.month("trade_time")},
+                   side, price, quantity, commission, commission_asset,
+                   quote_qty, is_maker, {store.epoch("trade_time")}
+            FROM trade_history
+            WHERE id > ?
+            ORDER BY id
+        """, (last_id,), chunk_size):
+        _write_chunk(rows, TRADE_SCHEMA, TRADE_DIR, str(rows[0][0]))
+        exported += len(rows)
+        last_id = rows[-1][0]
+        _write_state(TRADE_STATE, last_id)
+    if exported:
+        logger.info(f"[archive] 已匯出 {exported} 筆 trade_history")
+    return exported
+
+
+def read_prices(symbol: str, start: str = None, end: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    從歸檔讀取 symbol 在 [start, end) 的 (Unix 秒, 價格)，依時間排序。
+    只讀 ts / price 兩欄並以 memory-map 開檔，分區與 ts 條件在掃描時就先過濾。
+    """
+    if not _has_parquet(PRICE_DIR):
+        return np.empty(0, dtype="i8"), np.empty(0, dtype="f8")
+
+    filters = [("symbol", "=", symbol)]
+    start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+    if start_ts is not None:
+        filters.append(("ts", ">=", start_ts))
+    if end_ts is not None:
+        filters.append(("ts", "<", end_ts))
+
+    table = pq.read_table(
+        str(PRICE_DIR),
+        columns=["ts", "price"],
+        filters=filters,
+        partitioning=_PARTITIONING,
+        memory_map=True,
+    ).sort_by("ts")
+    return (table.column("ts").to_numpy().astype("i8", copy=False),
+            table.column("price").to_numpy().astype("f8", copy=False))
@@ -0,0 +1,224 @@
+# 文件：app/services/backtest.py
+#
+# 警報規則回測：把 price_history 載入 NumPy 陣列，
+# 以向量化方式重現 price_broadcast_thread 的 high / low 遲滯警報，
+# 用來評估某組 threshold_low / threshold_high 在歷史上會觸發幾次、何時觸發。
+
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from app.models.database import get_backend
+from app.services import archive
+
+logger = logging.getLogger(__name__)
+
+# sweep 一次最多掃描的門檻組合數（lows × highs）
+MAX_SWEEP_PAIRS = 10000
+
+_ROW_DTYPE = np.dtype([("ts", "i8"), ("price", "f8")])
+
+
+def load_prices(symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+                db_path: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    讀取 symbol 在 [start, end) 區間的價格，回傳 (Unix 秒 int64 陣列, 價格 float64 陣列)。
+    時間轉換在資料庫端完成，游標分批以 np.fromiter 串流進陣列，不建立中介 list。
+    已被 purge 的舊資料會從 Parquet 歸檔補上（archive.read_prices）。
+    """
+    store = get_backend(db_path)
+    # id <= 已歸檔最大 id 的列以歸檔為準（歸檔後刪除失敗時兩邊都有，避免重複）
+    sql = f"""
+        SELECT {store.epoch("timestamp")}, price
+        FROM price_history
+        WHERE symbol = ? AND id > ?
+    """
+    params = [symbol, archive.archived_price_id()]
+    if start:
+        sql += " AND timestamp >= ?"
+        params.append(start)
+    if end:
+        sql += " AND timestamp < ?"
+        params.append(end)
+    sql += " ORDER BY timestamp, id"
+
+    chunks = [np.fromiter(batch, dtype=_ROW_DTYPE) for batch in store.stream(sql, params)]
+    rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=_ROW_DTYPE)
+
+    arch_ts, arch_prices = archive.read_prices(symbol, start, end)
+    if arch_ts.size:
+        # 歸檔資料一定早於線上資料，直接串接即維持時間順序
+        return (np.concatenate([arch_ts, rows["ts"]]),
+                np.concatenate([arch_prices, rows["price"]]))
+    return rows["ts"], rows["price"]
+
+
+def _states(prices: np.ndarray, low: float, high: float) -> np.ndarray:
+    """每個 tick 的區間狀態：+1 高於 high、-1 低於 low、0 介於兩者之間（high 優先，同 elif 順序）"""
+    state = np.zeros(prices.shape, dtype=np.int8)
+    state[prices < low] = -1
+    state[prices > high] = 1
+    return state
+
+
+def simulate(prices: np.ndarray, low: float, high: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    重現遲滯警報：high 寄出後要等到 low 寄出才會重置，反之亦然。
+    等同於「非 0 狀態序列中，與前一個非 0 狀態不同的位置」觸發一次警報。
+    回傳 (觸發的 tick 索引, 方向 +1/-1)。
+    """
+    state = _states(prices, low, high)
+    idx = np.flatnonzero(state)
+    seq = state[idx]
+    if seq.size == 0:
+        return idx, seq
+    fired = np.empty(seq.shape, dtype=bool)
+    fired[0] = True
+    np.not_equal(seq[1:], seq[:-1], out=fired[1:])
+    return idx[fired], seq[fired]
+
+
+def count_firings(prices: np.ndarray, low: float, high: float) -> Tuple[int, int]:
+    """只計算 (high 次數, low 次數)，供參數掃描使用"""
+    _, sides = simulate(prices, low, high)
+    highs = int(np.count_nonzero(sides == 1))
+    return highs, int(sides.size) - highs
+
+
+def replay(symbol: str, low: float, high: float, start: str = None, end: str = None,
+           limit: int = 500, db_path: str = None) -> Dict:
+    """回測單一組門檻，回傳觸發次數、前 limit 筆觸發明細與耗時"""
+    t0 = time.perf_counter()
+    ts, prices = load_prices(symbol, start, end, db_path)
+    t1 = time.perf_counter()
+    idx, sides = simulate(prices, low, high)
+    t2 = time.perf_counter()
+
+    firings = [
+        {
+            "timestamp": int(ts[i]),
+            "side": "high" if s > 0 else "low",
+            "price": float(prices[i]),
+        }
+        for i, s in zip(idx[:limit], sides[:limit])
+    ]
+    return {
+        "symbol": symbol,
+        "low": low,
+        "high": high,
+        "rows": int(prices.size),
+        "firings": int(sides.size),
+        "high_firings": int(np.count_nonzero(sides == 1)),
+        "low_firings": int(np.count_nonzero(sides == -1)),
+        "events": firings,
+        "load_ms": (t1 - t0) * 1000,
+        "simulate_ms": (t2 - t1) * 1000,
+    }
+
+
+def _band_entries(inside: np.ndarray) -> np.ndarray:
+    """inside 為每個 tick 是否在區間內，回傳「進入區間」的 tick 索引（第 0 筆若在區間內也算）"""
+    entry = inside.copy()
+    entry[1:] &= ~inside[:-1]
+    return np.flatnonzero(entry)
+
+
+def _gap_extrema(prices: np.ndarray, entries: np.ndarray, reduce: np.ufunc) -> np.ndarray:
+    """相鄰兩次進入點之間（不含兩端）價格的極值，長度為 len(entries) - 1"""
+    if entries.size < 2:
+        return np.empty(0, dtype=prices.dtype)
+    bounds = np.empty(2 * (entries.size - 1), dtype=np.intp)
+    bounds[0::2] = entries[:-1] + 1
+    bounds[1::2] = entries[1:]
+    return np.sort(reduce.reduceat(prices, bounds)[0::2])
+
+
+def sweep(symbol: str, lows: Iterable[float], highs: Iterable[float],
+          start: str = None, end: str = None, db_path: str = None) -> Dict:
+    """
+    以同一份價格陣列掃描 lows × highs 的所有組合（low >= high 的組合略過），
+    回傳每組的 high / low 觸發次數。
+
+    警報只會在價格「進入」高於 high 的區間時觸發 high：第一次進入必定觸發，
+    之後只有在與上一次進入之間曾跌破 low 才會再觸發（low 方向同理）。
+    因此每個門檻只需對整段價格掃描一次，求出各次進入之間的最低 / 最高價，
+    每組 (low, high) 的次數就是「間隔最低價 < low」的個數，以二分搜尋取得，與資料筆數無關。
+    """
+    t0 = time.perf_counter()
+    ts, prices = load_prices(symbol, start, end, db_path)
+    t1 = time.perf_counter()
+
+    lows = [float(x) for x in lows]
+    highs = [float(x) for x in highs]
+    # high -> (是否曾進入, 各次進入之間的最低價)；low -> (是否曾進入, 各次進入之間的最高價)
+    high_gaps = {}
+    for high in set(highs):
+        entries = _band_entries(prices > high)
+        high_gaps[high] = (entries.size > 0, _gap_extrema(prices, entries, np.minimum))
+    low_gaps = {}
+    for low in set(lows):
+        entries = _band_entries(prices < low)
+        low_gaps[low] = (entries.size > 0, _gap_extrema(prices, entries, np.maximum))
+
+    results = []
+    for low in lows:
+        low_entered, gap_max = low_gaps[low]
+        for high in highs:
+            if low >= high:
+                continue
+            high_entered, gap_min = high_gaps[high]
+            h = int(high_entered) + int(np.searchsorted(gap_min, low, side="left"))
+            l = int(low_entered) + int(gap_max.size - np.searchsorted(gap_max, high, side="right"))
+            results.append({"low": low, "high": high, "high_firings": h, "low_firings": l,
+                            "firings": h + l})
+    t2 = time.perf_counter()
+
+    logger.info(f"[backtest] {symbol} 掃描 {len(results)} 組門檻，{prices.size} 筆價格，"
+                f"耗時 {(t2 - t0) * 1000:.1f}ms")
+    return {
+        "symbol": symbol,
+        "rows": int(prices.size),
+        "grid": results,
+        "load_ms": (t1 - t0) * 1000,
+        "simulate_ms": (t2 - t1) * 1000,
+    }
+
+
+def parse_range(spec: str, limit: int = MAX_SWEEP_PAIRS) -> np.ndarray:
+    """
+    解析 "0.4,0.5,0.6" 或 "start:stop:step"（含 stop）兩種格式；
+    非有限值或超過 limit 個值丟 ValueError（先算個數再建陣列，避免極小 step 佔滿記憶體）
+    """
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        if not all(np.isfinite((start, stop, step))):
+            raise ValueError("start / stop / step 必須是有限數值")
+        if step <= 0:
+            raise ValueError("step 必須大於 0")
+        count = np.floor((stop - start) / step + 0.5) + 1
+        if not np.isfinite(count) or count > limit:
+            raise ValueError(f"值的個數超過上限 {limit}")
+        return np.round(np.arange(start, stop + step / 2, step), 10)
+    parts = [x for x in spec.split(",") if x.strip()]
+    if len(parts) > limit:
+        raise ValueError(f"值的個數超過上限 {limit}")
+    values = np.array([float(x) for x in parts])
+    if not np.isfinite(values).all():
+        raise ValueError("門檻必須是有限數值")
+    return values
+
+
+def parse_time(value: Optional[str]) -> Optional[str]:
+    """
+    解析 start / end 查詢參數（ISO 日期或日期時間，無時區視為 UTC），
+    回傳與 price_history.timestamp 相同格式的 'YYYY-MM-DD HH:MM:SS'；格式錯誤丟 ValueError。
+    """
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(sep=" ", timespec="seconds")
@@ -2,7 +2,8 @@ import logging, os
 from datetime import datetime
 from binance.client import Client
 from dotenv import load_dotenv
-from app.models.database import init_db, save_trade
+from app.models.database import init_db, save_trades
+from app.metrics import SYNC_TOTAL, SYNC_TRADES_FETCHED
 
 load_dotenv()
 API_KEY = os.getenv("BINANCE_API_KEY","").strip()
@@ -13,13 +14,16 @@ def sync_trades():
     init_db()
     if not (API_KEY and API_SECRET):
         logging.error("缺少 Binance API Key/Secret！")
+        SYNC_TOTAL.labels(result="skipped").inc()
         return
     client = Client(API_KEY, API_SECRET)
     try:
         trades = client.get_my_trades(symbol=SYMBOL)
     except Exception as e:
         logging.error(f"抓取 Binance 交易執行檔失敗: {e}")
+        SYNC_TOTAL.labels(result="failure").inc()
         return
 
-    for t in trades:
-        save_trade(t)
+    SYNC_TRADES_FETCHED.inc(len(trades))
+    save_trades(trades)
+    SYNC_TOTAL.labels(result="success").inc()
@@ -0,0 +1,270 @@
+# 文件：app/services/cluster.py
+#
+# 多 worker 部署支援：
+#   - LeaderElector：確保只有一個 process 執行價格 / 新聞 / 交易同步背景迴圈
+#   - MessageBus：leader 發布 tick，所有 worker 訂閱後推送給各自的 Socket.IO 連線
+#
+# 有設定 REDIS_URL 時使用 Redis（可跨主機）；
+# 否則使用本機替代方案（檔案鎖 + 行程內訊息佇列），僅適用單一 worker；
+# 沒有 Redis 時若有第二個 process 啟動，它拿不到 leader 也收不到 tick，會記錄錯誤。
+
+import os
+import json
+import time
+import uuid
+import socket
+import queue
+import logging
+import threading
+from typing import Callable, Dict, List
+
+from app.models.database import DATA_DIR
+from app.metrics import BUS_QUEUE_DEPTH, BUS_DELIVERY_LAG, CLUSTER_LEADER
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+CHANNEL_PREFIX = os.getenv("CLUSTER_CHANNEL_PREFIX", "crypto_alert")
+LEADER_TTL = int(os.getenv("CLUSTER_LEADER_TTL", "15"))  # 秒
+LOCK_PATH = DATA_DIR / "leader.lock"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _redis_client():
+    import redis  # 只有多 worker 模式才需要
+    return redis.Redis.from_url(REDIS_URL)
+
+
+# ---------- Leader 選舉 ----------
+
+class FileLockElector:
+    """以 fcntl.flock 搶本機檔案鎖；process 結束時 OS 會自動釋放。"""
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = str(path)
+        self._fh = None
+
+    def try_acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        import fcntl
+        fh = open(self.path, "a+")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(WORKER_ID)
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def is_leader(self) -> bool:
+        return self._fh is not None
+
+
+class RedisElector:
+    """以 SET NX PX 取得租約，leader 需在 TTL 內持續續約。"""
+
+    # 只有目前持有者才能續約，避免覆蓋別人的租約
+    _RENEW = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    def __init__(self, key=f"{CHANNEL_PREFIX}:leader", ttl=LEADER_TTL):
+        self.key = key
+        self.ttl_ms = ttl * 1000
+        self._r = _redis_client()
+        self._leader = False
+
+    def try_acquire(self) -> bool:
+        try:
+            if self._leader:
+                self._leader = bool(self._r.eval(self._RENEW, 1, self.key, WORKER_ID, self.ttl_ms))
+            else:
+                self._leader = bool(self._r.set(self.key, WORKER_ID, nx=True, px=self.ttl_ms))
+        except Exception as e:
+            logger.error(f"[cluster] Redis leader 續約失敗: {e}")
+            self._leader = False
+        return self._leader
+
+    def is_leader(self) -> bool:
+        return self._leader
+
+
+# ---------- 訊息佇列 ----------
+
+class LocalBus:
+    """行程內的替代實作：publish 直接呼叫本行程的訂閱者。"""
+
+    def __init__(self):
+        self._subs: Dict[str, List[Callable]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        with self._lock:
+            self._subs.setdefault(channel, []).append(callback)
+
+    def on_reconnect(self, callback: Callable[[], None]):
+        pass    # 行程內不會斷線
+
+    def publish(self, channel: str, payload: dict):
+        with self._lock:
+            callbacks = list(self._subs.get(channel, []))
+        for cb in callbacks:
+            try:
+                cb(payload)
+            except Exception as e:
+                logger.error(f"[cluster] 處理 {channel} 訊息失敗: {e}")
+
+
+class RedisBus:
+    """
+    Redis pub/sub：每個 worker 一條監聽執行緒把訊息放進佇列，另一條分派執行緒呼叫本地訂閱者，
+    訂閱者變慢時佇列深度（cluster_bus_queue_depth）會上升，而不會拖住 Redis 連線。
+    PubSub 物件不是 thread-safe，SUBSCRIBE 一律由監聽執行緒自己送出；
+    連線中斷時以指數退避重連並重新訂閱所有 channel。
+    """
+
+    POLL_TIMEOUT = 1.0
+    MAX_BACKOFF = 30
+
+    def __init__(self):
+        self._r = _redis_client()
+        self._local = LocalBus()
+        self._channels = set()
+        self._reconnect_callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._queue = queue.Queue()
+        BUS_QUEUE_DEPTH.set_function(self._queue.qsize)
+
+    def _channel(self, channel: str) -> str:
+        return f"{CHANNEL_PREFIX}:{channel}"
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        self._local.subscribe(channel, callback)
+        with self._lock:
+            self._channels.add(channel)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, daemon=True)
+                self._thread.start()
+                threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def on_reconnect(self, callback: Callable[[], None]):
+        """重連成功後呼叫；斷線期間的訊息已遺失，訂閱者可藉此重設本地狀態"""
+        self._reconnect_callbacks.append(callback)
+
+    def publish(self, channel: str, payload: dict):
+        try:
+            self._r.publish(self._channel(channel),
+                            json.dumps({"sent": time.time(), "payload": payload}))
+        except Exception as e:
+            logger.error(f"[cluster] 發布 {channel} 失敗: {e}")
+
+    def _listen(self):
+        backoff = 1
+        connected_before = False
+        while True:
+            pubsub = self._r.pubsub(ignore_subscribe_messages=True)
+            started = time.monotonic()
+            try:
+                self._consume(pubsub, reconnected=connected_before)
+            except Exception as e:
+                logger.error(f"[cluster] Redis 訂閱中斷，{backoff} 秒後重連: {e}")
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            connected_before = True
+            if time.monotonic() - started > self.MAX_BACKOFF:
+                backoff = 1     # 連線曾穩定一段時間，退避重新計算
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+    def _consume(self, pubsub, reconnected: bool):
+        prefix = f"{CHANNEL_PREFIX}:"
+        subscribed = set()
+        while True:
+            with self._lock:
+                pending = self._channels - subscribed
+            if pending:
+                pubsub.subscribe(*(self._channel(c) for c in pending))
+                subscribed |= pending
+                if reconnected:
+                    reconnected = False
+                    logger.info(f"[cluster] Redis 已重連，重新訂閱 {len(subscribed)} 個 channel")
+                    for cb in list(self._reconnect_callbacks):
+                        try:
+                            cb()
+                        except Exception as e:
+                            logger.error(f"[cluster] 重連回呼失敗: {e}")
+
+            msg = pubsub.get_message(timeout=self.POLL_TIMEOUT)
+            if msg is None or msg.get("type") != "message":
+                continue
+            try:
+                channel = msg["channel"].decode()[len(prefix):]
+                envelope = json.loads(msg["data"])
+                self._queue.put((channel, envelope["sent"], envelope["payload"]))
+            except Exception as e:
+                logger.error(f"[cluster] 無法解析訊息: {e}")
+
+    def _dispatch(self):
+        while True:
+            channel, sent, payload = self._queue.get()
+            BUS_DELIVERY_LAG.labels(channel=channel).observe(max(0.0, time.time() - sent))
+            self._local.publish(channel, payload)
+
+
+# ---------- 對外介面 ----------
+
+if REDIS_URL:
+    elector = RedisElector()
+    bus = RedisBus()
+else:
+    elector = FileLockElector()
+    bus = LocalBus()
+
+
+def is_leader() -> bool:
+    return elector.is_leader()
+
+
+def run_when_leader(targets: List[Callable], interval: int = 5):
+    """
+    背景執行緒：持續嘗試成為 leader，取得後才啟動 targets 的背景迴圈。
+    Redis 模式下 leader 需定期續約；targets 每輪應先檢查 is_leader()，
+    失去租約時跳過該輪工作，重新取得後即可繼續。
+    """
+    def _loop():
+        started = False
+        warned = False
+        while True:
+            leader = elector.try_acquire()
+            CLUSTER_LEADER.set(1 if leader else 0)
+            if not leader and not REDIS_URL and not warned:
+                # 檔案鎖只保證單一 leader，LocalBus 卻無法跨 process 傳遞 tick，
+                # 這個 worker 的 Socket.IO 連線將收不到任何推送
+                logger.error(
+                    f"[cluster] 另一個 process 持有 {LOCK_PATH}，但未設定 REDIS_URL："
+                    "本 worker 收不到價格推送，多 worker 部署請設定 REDIS_URL"
+                )
+                warned = True
+            if leader and not started:
+                logger.info(f"[cluster] {WORKER_ID} 成為 leader，啟動背景任務")
+                for target in targets:
+                    threading.Thread(target=target, daemon=True).start()
+                started = True
+            time.sleep(interval)
+
+    t = threading.Thread(target=_loop, daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,162 @@
+# 文件：app/services/indicators.py
+#
+# 即時技術指標：每個 tick 以 O(1) 增量更新 SMA、EMA、RSI、布林通道與波動率。
+# 每個 symbol 只持有兩個固定長度的 array('d') 環形緩衝區，記憶體不隨 tick 數成長。
+
+import math
+import logging
+import threading
+from array import array
+from typing import Callable, Dict, Optional
+
+from app.models.database import load_recent_prices
+
+logger = logging.getLogger(__name__)
+
+WINDOW = 20        # SMA / 布林通道 / 波動率視窗
+EMA_SPAN = 20
+RSI_PERIOD = 14
+BB_WIDTH = 2.0     # 布林通道標準差倍數
+
+
+class RollingWindow:
+    """固定長度環形緩衝區，同時維護視窗內的總和與平方和"""
+
+    __slots__ = ("size", "buf", "head", "count", "total", "total_sq")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.buf = array("d", bytes(8 * size))
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, x: float):
+        if self.count == self.size:
+            old = self.buf[self.head]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.buf[self.head] = x
+        self.total += x
+        self.total_sq += x * x
+        self.head += 1
+        if self.head == self.size:
+            self.head = 0
+            # 每繞一圈重算一次總和，消除浮點累積誤差（攤提後仍為 O(1)）
+            self.total = math.fsum(self.buf)
+            self.total_sq = math.fsum(v * v for v in self.buf)
+
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def mean(self) -> float:
+        return self.total / self.count
+
+    def std(self) -> float:
+        m = self.mean()
+        return math.sqrt(max(self.total_sq / self.count - m * m, 0.0))
+
+
+class SymbolIndicators:
+    """單一 symbol 的指標狀態"""
+
+    __slots__ = ("prices", "returns", "last", "ema", "avg_gain", "avg_loss", "rsi_n", "last_id")
+
+    def __init__(self):
+        self.prices = RollingWindow(WINDOW)
+        self.returns = RollingWindow(WINDOW)
+        self.last = None
+        self.ema = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.rsi_n = 0
+        self.last_id = 0    # 已納入計算的最大 price_history.id
+
+    def update(self, price: float):
+        self.prices.push(price)
+
+        alpha = 2.0 / (EMA_SPAN + 1)
+        self.ema = price if self.ema is None else self.ema + alpha * (price - self.ema)
+
+        if self.last is not None and self.last > 0:
+            change = price - self.last
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            # Wilder 平滑：前 RSI_PERIOD 筆取平均，之後指數平滑
+            if self.rsi_n < RSI_PERIOD:
+                self.rsi_n += 1
+                self.avg_gain += (gain - self.avg_gain) / self.rsi_n
+                self.avg_loss += (loss - self.avg_loss) / self.rsi_n
+            else:
+                self.avg_gain = (self.avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                self.avg_loss = (self.avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+            if price > 0:
+                self.returns.push(math.log(price / self.last))
+        self.last = price
+
+    def rsi(self) -> Optional[float]:
+        if self.rsi_n < RSI_PERIOD:
+            return None
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100.0 - 100.0 / (1.0 + rs)
+
+    def snapshot(self) -> Dict:
+        out = {"price": self.last, "ema": self.ema, "rsi": self.rsi(),
+               "sma": None, "bb_upper": None, "bb_lower": None, "volatility": None}
+        if self.prices.full():
+            mid, sd = self.prices.mean(), self.prices.std()
+            out.update(sma=mid, bb_upper=mid + BB_WIDTH * sd, bb_lower=mid - BB_WIDTH * sd)
+        if self.returns.full():
+            out["volatility"] = self.returns.std() * 100  # 每 tick 對數報酬標準差 (%)
+        return out
+
+
+class IndicatorEngine:
+    """管理多個 symbol 的指標；第一次看到某 symbol 時從 price_history 暖機"""
+
+    def __init__(self, loader: Callable[[str, int], list] = load_recent_prices):
+        self._loader = loader
+        self._states: Dict[str, SymbolIndicators] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, symbol: str) -> SymbolIndicators:
+        state = self._states.get(symbol)
+        if state is None:
+            state = SymbolIndicators()
+            # RSI 需要較長歷史才會收斂，多讀幾倍視窗
+            warm = max(WINDOW, RSI_PERIOD) * 5
+            try:
+                for row_id, _, price in self._loader(symbol, warm):
+                    state.update(price)
+                    state.last_id = row_id
+                logger.info(f"[indicators] {symbol} 以 {state.prices.count} 筆歷史價格暖機")
+            except Exception as e:
+                logger.error(f"[indicators] {symbol} 暖機失敗: {e}")
+            self._states[symbol] = state
+        return state
+
+    def warm(self, symbol: str):
+        with self._lock:
+            self._state(symbol)
+
+    def update(self, symbol: str, price: float, row_id: int = None) -> Dict:
+        """
+        套用一筆新價格。row_id 為該筆在 price_history 的 id：
+        價格通常先寫入 DB 再更新指標，若暖機時已讀到這一筆就不重複計入。
+        """
+        with self._lock:
+            state = self._state(symbol)
+            if row_id is None or row_id > state.last_id:
+                state.update(price)
+                if row_id is not None:
+                    state.last_id = row_id
+            snap = state.snapshot()
+        snap["symbol"] = symbol
+        return snap
+
+
+engine = IndicatorEngine()
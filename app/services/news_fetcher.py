@@ -8,6 +8,8 @@ from pathlib import Path
 import requests
 from dotenv import load_dotenv
 
+from app.metrics import NEWS_FETCH_TOTAL, NEWS_FETCH_DURATION
+
 # 載入 .env 裡的環境變數
 load_dotenv()
 
@@ -71,15 +73,20 @@ def _filter_latest(articles: List[Dict]) -> List[Dict]:
 def _search_cryptocompare(category: str) -> List[Dict]:
     if not CRYPTOCOMPARE_KEY:
         logging.warning(f"CryptoCompare API Key 未設定，跳過 {category} 搜尋")
+        NEWS_FETCH_TOTAL.labels(category=category, result="skipped").inc()
         return []
     params = {"categories": category.upper(), "lang": "EN"}
     try:
-        resp = requests.get(CRYPTOCOMPARE_URL, headers=CC_HEADERS, params=params, timeout=10)
-        resp.raise_for_status()
-        articles = resp.json().get("Data", [])
-        return _filter_latest(articles)
+        with NEWS_FETCH_DURATION.labels(category=category).time():
+            resp = requests.get(CRYPTOCOMPARE_URL, headers=CC_HEADERS, params=params, timeout=10)
+            resp.raise_for_status()
+            articles = resp.json().get("Data", [])
+        result = _filter_latest(articles)
+        NEWS_FETCH_TOTAL.labels(category=category, result="success" if result else "empty").inc()
+        return result
     except Exception as e:
         logging.error(f"CryptoCompare API ({category}) 失敗: {e}")
+        NEWS_FETCH_TOTAL.labels(category=category, result="failure").inc()
         return []
 
 
@@ -93,6 +100,8 @@ def fetch_top_economy_news() -> List[Dict]:
 
 def fetch_daily_news() -> Dict[str, List[Dict]]:
     cache = _load_cache()
+    if cache:
+        NEWS_FETCH_TOTAL.labels(category="all", result="cache_hit").inc()
     bc = cache.get("blockchain") or fetch_top_blockchain_news()
     ec = cache.get("economy") or fetch_top_economy_news()
     if not cache:
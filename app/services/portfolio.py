@@ -0,0 +1,126 @@
+# 文件：app/services/portfolio.py
+#
+# 持倉估值：以平均成本法從 trade_history 累積各交易對的持倉、平均成本與已實現損益，
+# 只處理上次之後新寫入的成交（依 trade_history.id 遞增），
+# 每個 tick 再搭配最新價格計算未實現損益，工作量與交易紀錄長度無關。
+
+import logging
+import threading
+from typing import Dict, Optional
+
+from app.models.database import get_backend
+from app.metrics import DB_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Binance 交易對 → CoinGecko 幣種 id（價格來源使用的 symbol）
+DEFAULT_PRICE_IDS = {
+    "ADAUSDT": "cardano",
+    "BTCUSDT": "bitcoin",
+    "ETHUSDT": "ethereum",
+}
+
+
+class Position:
+    __slots__ = ("pair", "quantity", "cost", "realized", "last_price")
+
+    def __init__(self, pair: str):
+        self.pair = pair
+        self.quantity = 0.0
+        self.cost = 0.0        # 目前持倉的總成本
+        self.realized = 0.0
+        self.last_price = None
+
+    @property
+    def avg_cost(self) -> Optional[float]:
+        return self.cost / self.quantity if self.quantity > 0 else None
+
+    def apply(self, side: str, price: float, qty: float):
+        if side == "BUY":
+            self.quantity += qty
+            self.cost += price * qty
+        else:
+            # 現貨無法放空；超出持倉的部分視為歷史紀錄起點之前買入，不計損益
+            closed = min(qty, self.quantity)
+            if closed > 0:
+                avg = self.cost / self.quantity
+                self.realized += (price - avg) * closed
+                self.cost -= avg * closed
+                self.quantity -= closed
+            if self.quantity <= 1e-12:
+                self.quantity = 0.0
+                self.cost = 0.0
+
+    def to_dict(self) -> Dict:
+        value = unrealized = None
+        if self.last_price is not None:
+            value = self.quantity * self.last_price
+            unrealized = value - self.cost
+        return {
+            "pair": self.pair,
+            "quantity": self.quantity,
+            "avg_cost": self.avg_cost,
+            "cost": self.cost,
+            "price": self.last_price,
+            "value": value,
+            "unrealized_pnl": unrealized,
+            "realized_pnl": self.realized,
+        }
+
+
+class Portfolio:
+    def __init__(self, price_ids: Dict[str, str] = None, db_path: str = None):
+        self.price_ids = dict(price_ids or DEFAULT_PRICE_IDS)
+        self.db_path = db_path
+        self.positions: Dict[str, Position] = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """讀入 id 大於上次處理位置的成交並累加到持倉，回傳新處理的筆數"""
+        with DB_DURATION.labels(operation="portfolio_refresh").time():
+            store = get_backend(self.db_path)
+            with store.connect() as conn:
+                rows = store.execute(conn, """
+                    SELECT id, symbol, side, price, quantity
+                    FROM trade_history
+                    WHERE id > ?
+                    ORDER BY id
+                """, (self._last_id,)).fetchall()
+
+        with self._lock:
+            for row_id, pair, side, price, qty in rows:
+                pos = self.positions.get(pair)
+                if pos is None:
+                    pos = self.positions[pair] = Position(pair)
+                pos.apply(side.upper(), price, qty)
+                self._last_id = row_id
+        if rows:
+            logger.info(f"[portfolio] 已累加 {len(rows)} 筆新成交")
+        return len(rows)
+
+    def on_price(self, symbol: str, price: float) -> Dict:
+        """套用 symbol（CoinGecko id）的最新價格，回傳整體估值快照"""
+        with self._lock:
+            for pair, pos in self.positions.items():
+                if self.price_ids.get(pair) == symbol:
+                    pos.last_price = price
+            return self._snapshot()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict:
+        positions = [p.to_dict() for p in self.positions.values()]
+        priced = [p for p in positions if p["value"] is not None]
+        return {
+            "positions": positions,
+            "total_value": sum(p["value"] for p in priced),
+            "total_cost": sum(p["cost"] for p in priced),
+            "unrealized_pnl": sum(p["unrealized_pnl"] for p in priced),
+            "realized_pnl": sum(p["realized_pnl"] for p in positions),
+        }
+
+
+portfolio = Portfolio()
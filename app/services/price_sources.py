@@ -0,0 +1,234 @@
+# 文件：app/services/price_sources.py
+#
+# 價格來源抽象層：
+#   - 多個 provider（CoinGecko、Binance ticker），各自有 circuit breaker
+#   - hedged request：先問主要來源，逾 HEDGE_DELAY 未回應就同時問下一個，取第一個成功的結果
+#   - 最新價格快取：API 與 Socket.IO 新連線只讀快取（附價格年齡），從不同步呼叫上游
+# 上游變慢或被限流時，tick 迴圈最多等待 FETCH_TIMEOUT，API 請求則完全不受影響。
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from app.metrics import PRICE_SOURCE_REQUESTS, PRICE_SOURCE_LATENCY, PRICE_SOURCE_BREAKER
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = float(os.getenv("PRICE_REQUEST_TIMEOUT", "3"))   # 單一 provider 的 HTTP 逾時
+HEDGE_DELAY = float(os.getenv("PRICE_HEDGE_DELAY", "0.5"))         # 多久沒回應就改問下一個
+FETCH_TIMEOUT = float(os.getenv("PRICE_FETCH_TIMEOUT", "4"))       # 整次 fetch 的上限
+CACHE_MAX_AGE = float(os.getenv("PRICE_CACHE_MAX_AGE", "120"))     # 快取價格可接受的最大年齡 (秒)
+
+# CoinGecko 幣種 id → Binance 交易對
+BINANCE_PAIRS = {
+    "cardano": "ADAUSDT",
+    "bitcoin": "BTCUSDT",
+    "ethereum": "ETHUSDT",
+}
+
+
+class CircuitBreaker:
+    """連續失敗 failure_threshold 次後斷路 reset_timeout 秒，之後放行一次試探（half-open）"""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        PRICE_SOURCE_BREAKER.labels(source=name).set(self.CLOSED)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set(self.HALF_OPEN)
+                return True
+            if self.state == self.HALF_OPEN:
+                # 試探請求進行中，其餘請求先不放行
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._set(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set(self.OPEN)
+
+    def _set(self, state: int):
+        if state != self.state:
+            logger.warning(f"[price_sources] {self.name} breaker: {self.state} -> {state}")
+        self.state = state
+        PRICE_SOURCE_BREAKER.labels(source=self.name).set(state)
+
+
+class PriceProvider:
+    name = "base"
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(self.name)
+        self.session = requests.Session()
+
+    def supports(self, symbol: str) -> bool:
+        return True
+
+    def fetch(self, symbol: str) -> float:
+        raise NotImplementedError
+
+
+class CoinGeckoProvider(PriceProvider):
+    name = "coingecko"
+    URL = "https://api.coingecko.com/api/v3/simple/price"
+
+    def fetch(self, symbol: str) -> float:
+        resp = self.session.get(self.URL, params={"ids": symbol, "vs_currencies": "usd"},
+                                timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return float(resp.json()[symbol]["usd"])
+
+
+class BinanceTickerProvider(PriceProvider):
+    """Binance 公開 ticker（不需 API key），以 USDT 報價近似 USD"""
+    name = "binance"
+    URL = "https://api.binance.com/api/v3/ticker/price"
+
+    def supports(self, symbol: str) -> bool:
+        return symbol in BINANCE_PAIRS
+
+    def fetch(self, symbol: str) -> float:
+        resp = self.session.get(self.URL, params={"symbol": BINANCE_PAIRS[symbol]},
+                                timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return float(resp.json()["price"])
+
+
+class PriceUnavailable(Exception):
+    pass
+
+
+class PriceService:
+    def __init__(self, providers: List[PriceProvider]):
+        self.providers = providers
+        self._pool = ThreadPoolExecutor(max_workers=4 * len(providers), thread_name_prefix="price")
+        self._latest: Dict[str, Tuple[float, float]] = {}   # symbol -> (price, monotonic 時間)
+        self._refreshing = set()                             # 背景補抓中的 symbol
+        self._lock = threading.Lock()
+
+    def _call(self, provider: PriceProvider, symbol: str) -> float:
+        t0 = time.perf_counter()
+        try:
+            price = provider.fetch(symbol)
+        except Exception:
+            provider.breaker.record_failure()
+            PRICE_SOURCE_REQUESTS.labels(source=provider.name, result="failure").inc()
+            raise
+        finally:
+            PRICE_SOURCE_LATENCY.labels(source=provider.name).observe(time.perf_counter() - t0)
+        provider.breaker.record_success()
+        PRICE_SOURCE_REQUESTS.labels(source=provider.name, result="success").inc()
+        return price
+
+    def fetch(self, symbol: str) -> float:
+        """
+        依序向可用的 provider 發出 hedged request，回傳第一個成功的價格。
+        斷路中的 provider 直接略過；全部失敗或逾時則丟出 PriceUnavailable。
+        """
+        candidates = [p for p in self.providers if p.supports(symbol)]
+        deadline = time.monotonic() + FETCH_TIMEOUT
+        pending = {}
+        errors = []
+
+        while True:
+            # 目前沒有進行中的請求，或已超過 hedge 延遲 → 再啟動下一個 provider
+            while candidates:
+                provider = candidates.pop(0)
+                if not provider.breaker.allow():
+                    PRICE_SOURCE_REQUESTS.labels(source=provider.name, result="skipped").inc()
+                    continue
+                pending[self._pool.submit(self._call, provider, symbol)] = provider
+                break
+
+            if not pending:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = min(HEDGE_DELAY, remaining) if candidates else remaining
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                provider = pending.pop(fut)
+                try:
+                    price = fut.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+                    continue
+                self.remember(symbol, price)
+                return price
+
+        for fut, provider in pending.items():
+            errors.append(f"{provider.name}: timeout")
+        raise PriceUnavailable(f"所有價格來源皆失敗 ({symbol}): {'; '.join(errors) or '無可用來源'}")
+
+    def remember(self, symbol: str, price: float):
+        with self._lock:
+            self._latest[symbol] = (price, time.monotonic())
+
+    def cached_price(self, symbol: str) -> Tuple[Optional[float], Optional[float]]:
+        """
+        請求路徑用：回傳 (最後已知價格, 距今秒數)，沒有快取時為 (None, None)。
+        永不同步呼叫上游；沒有快取或已超過 CACHE_MAX_AGE 時在背景補抓一次。
+        """
+        with self._lock:
+            item = self._latest.get(symbol)
+        if item is None:
+            self.refresh_async(symbol)
+            return None, None
+        age = time.monotonic() - item[1]
+        if age > CACHE_MAX_AGE:
+            self.refresh_async(symbol)
+        return item[0], age
+
+    def refresh_async(self, symbol: str):
+        """在背景執行一次 fetch 更新快取；同一 symbol 同時只會有一個"""
+        with self._lock:
+            if symbol in self._refreshing:
+                return
+            self._refreshing.add(symbol)
+
+        def _run():
+            try:
+                self.fetch(symbol)
+            except PriceUnavailable as e:
+                logger.warning(f"[price_sources] 背景更新失敗: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(symbol)
+
+        # 不放進 self._pool：fetch 本身會在 pool 上等待 provider，避免互相占滿
+        threading.Thread(target=_run, daemon=True, name=f"price-refresh-{symbol}").start()
+
+    def health(self) -> List[Dict]:
+        return [
+            {"source": p.name, "breaker": ("closed", "half_open", "open")[p.breaker.state],
+             "consecutive_failures": p.breaker.failures}
+            for p in self.providers
+        ]
+
+
+price_service = PriceService([CoinGeckoProvider(), BinanceTickerProvider()])
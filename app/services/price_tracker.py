@@ -2,18 +2,16 @@
 
 import os
 import logging
-import sqlite3
 from datetime import datetime, timedelta
-import requests
 import gspread
-from app.models.database import init_db, save_price, DB_PATH
+from app.models.database import init_db, save_price, backend
+from app.services.archive import archive_prices
+from app.services.price_sources import price_service
 import json
 
 # 初始化資料表（price_history）
 init_db()
 
-COINGECKO_URL = 'https://api.coingecko.com/api/v3/simple/price'
-
 # Google Sheets 設定
 # GOOGLE_SA_JSON: 環境變數裡的整段 service account JSON
 # GOOGLE_SHEET_KEY: 試算表 ID
@@ -25,13 +23,10 @@ GS_WORKSHEET_NAME   = os.environ.get('GOOGLE_SHEET_WORKSHEET', '')
 
 def get_price(symbol: str) -> float:
     """
-    取得指定幣種的 USD 價格
+    取得指定幣種的 USD 價格（經由 price_sources 的多來源 failover）
     """
     try:
-        resp = requests.get(f"{COINGECKO_URL}?ids={symbol}&vs_currencies=usd", timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        return data[symbol]['usd']
+        return price_service.fetch(symbol)
     except Exception as e:
         logging.error(f"get_price 失敗 ({symbol}): {e}")
         raise
@@ -39,20 +34,29 @@ def get_price(symbol: str) -> float:
 
 def purge_old_prices(days: int = 30):
     """
-    刪除 price_history 中超過 days 天的舊資料
+    刪除 price_history 中超過 days 天的舊資料；刪除前先歸檔成 Parquet，
+    且只刪除已成功歸檔的列（id <= 歸檔的最大 id，包含上次歸檔後刪除失敗而留下的列）
     """
-    conn = sqlite3.connect(DB_PATH)
+    cutoff = datetime.now() - timedelta(days=days)
+    cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
     try:
-        cursor = conn.cursor()
-        cutoff = datetime.now() - timedelta(days=days)
-        cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("DELETE FROM price_history WHERE timestamp < ?", (cutoff_str,))
-        conn.commit()
-        logging.info(f"已刪除 {cutoff_str} 之前的價格記錄")
+        _, max_id = archive_prices(cutoff_str)
+    except Exception as e:
+        logging.error(f"purge_old_prices 歸檔失敗，本次不刪除: {e}")
+        return
+    if not max_id:
+        return
+
+    try:
+        with backend.connect() as conn:
+            backend.execute(
+                conn,
+                "DELETE FROM price_history WHERE timestamp < ? AND id <= ?",
+                (cutoff_str, max_id)
+            )
+        logging.info(f"已歸檔並刪除 {cutoff_str} 之前的價格記錄")
     except Exception as e:
         logging.error(f"purge_old_prices 失敗: {e}")
-    finally:
-        conn.close()
 
 
 def record_to_sheet(symbol: str, price: float):
@@ -104,14 +108,10 @@ def list_price_history(limit: int = 100) -> list[dict]:
     """
     回傳最近的 price_history 紀錄
     """
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
+    with backend.connect() as conn:
+        rows = backend.fetchall(backend.execute(
+            conn,
             "SELECT symbol, price, timestamp FROM price_history ORDER BY id DESC LIMIT ?",
             (limit,)
-        )
-        rows = cursor.fetchall()
-    finally:
-        conn.close()
+        ))
     return [{'symbol': r[0], 'price': r[1], 'timestamp': r[2]} for r in rows]
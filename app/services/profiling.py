@@ -0,0 +1,127 @@
+# 文件：app/services/profiling.py
+#
+# 內建效能剖析工具：
+#   - Trace / span：量測一次請求或背景任務內各步驟耗時，超過門檻時把明細寫進 log
+#   - sample_stacks：取樣式 profiler，回傳 flamegraph 可用的 folded stacks
+#
+# PROFILING_ENABLED=1 才會開放取樣端點；span 計時只用 perf_counter，常駐開啟。
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+SLOW_THRESHOLD_MS = float(os.getenv("SLOW_THRESHOLD_MS", "1000"))
+JOB_SLOW_THRESHOLD_MS = float(os.getenv("JOB_SLOW_THRESHOLD_MS", "30000"))   # 背景排程任務用
+MAX_PROFILE_SECONDS = 60
+
+_local = threading.local()
+_profile_lock = threading.Lock()
+
+
+class Trace:
+    """一次請求 / 任務的計時紀錄，spans 依發生順序保存 (名稱, 毫秒)"""
+
+    __slots__ = ("name", "start", "spans")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{n}={ms:.1f}ms" for n, ms in self.spans)
+
+
+def start_trace(name: str) -> Trace:
+    trace = Trace(name)
+    _local.trace = trace
+    return trace
+
+
+def finish_trace(threshold_ms: float = None, failed: bool = False):
+    """結束目前執行緒的 trace；總耗時超過門檻時記錄各步驟明細（failed 表示以例外結束）"""
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if trace is None:
+        return None
+    total = trace.elapsed_ms()
+    limit = SLOW_THRESHOLD_MS if threshold_ms is None else threshold_ms
+    if total >= limit:
+        status = "（失敗）" if failed else ""
+        logger.warning(f"[slow] {trace.name}{status} 耗時 {total:.1f}ms ({trace.breakdown() or '無分段'})")
+    return total
+
+
+@contextmanager
+def span(name: str):
+    """在目前 trace 內量測一個步驟；沒有進行中的 trace 時不做任何事"""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((name, (time.perf_counter() - t0) * 1000))
+
+
+@contextmanager
+def traced(name: str, threshold_ms: float = None):
+    """包住一整段任務：start_trace + finish_trace，任務丟出例外時也會記錄"""
+    start_trace(name)
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        finish_trace(threshold_ms, failed=failed)
+
+
+# ---------- 取樣式 profiler ----------
+
+def _frame_stack(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """
+    在 seconds 秒內每 interval 秒擷取一次所有執行緒的 stack，
+    回傳 folded 格式（每行 "thread;frame;frame count"），可直接餵給 flamegraph.pl / speedscope。
+    同一時間只允許一個取樣進行。
+    """
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("已有 profiler 取樣進行中")
+    try:
+        me = threading.get_ident()
+        names = {}
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                thread_name = names.get(ident, str(ident))
+                counts[f"{thread_name};{_frame_stack(frame)}"] += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+    return "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
@@ -0,0 +1,108 @@
+# 文件：app/services/rate_limit.py
+#
+# 簡單的 token bucket 限流（每個 client IP 一個 bucket），用於寫入型 API。
+# 超過速率時回 429 並附 Retry-After；bucket 數量有上限，閒置最久的會被淘汰。
+# 設定 REDIS_URL（多 worker）時 bucket 存在 Redis，所有 worker 共用同一個速率。
+# client IP 取自 request.remote_addr；在 nginx 後面時需設定 TRUSTED_PROXIES（見 run.py）。
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify
+
+from app.services import cluster
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate            # 每秒補充的 token 數
+        self.burst = burst          # bucket 容量
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, 上次更新時間)
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """取得一個 token；成功回傳 0，否則回傳需等待的秒數"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                wait = 0.0
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisTokenBucketLimiter:
+    """與 TokenBucketLimiter 相同的演算法，狀態放在 Redis，讓多個 worker 共用 bucket"""
+
+    # KEYS[1] = bucket；ARGV = rate, burst, ttl(ms)。以 Redis 的 TIME 計時，不受各主機時鐘誤差影響
+    _ACQUIRE = """
+    local t = redis.call('time')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local state = redis.call('hmget', KEYS[1], 'tokens', 'last')
+    local tokens = tonumber(state[1]) or burst
+    local last = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'last', tostring(now))
+    redis.call('pexpire', KEYS[1], ARGV[3])
+    return tostring(wait)
+    """
+
+    def __init__(self, rate: float, burst: int, name: str):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = f"{cluster.CHANNEL_PREFIX}:ratelimit:{name}:"
+        # bucket 補滿所需時間後即可丟棄，閒置 key 由 Redis 自動過期
+        self.ttl_ms = int(burst / rate * 1000) + 1000
+        self._r = cluster._redis_client()
+        # Redis 無法連線時退回單機 bucket，不因限流讓寫入 API 全部失敗
+        self._fallback = TokenBucketLimiter(rate, burst)
+
+    def acquire(self, key: str) -> float:
+        try:
+            return float(self._r.eval(self._ACQUIRE, 1, self.prefix + key,
+                                      self.rate, self.burst, self.ttl_ms))
+        except Exception as e:
+            logger.error(f"[rate_limit] Redis 限流失敗，改用本機 bucket: {e}")
+            return self._fallback.acquire(key)
+
+
+def make_limiter(rate: float, burst: int, name: str):
+    """多 worker 模式（有 REDIS_URL）回傳 Redis 版，否則回傳單機版"""
+    if cluster.REDIS_URL:
+        return RedisTokenBucketLimiter(rate, burst, name)
+    return TokenBucketLimiter(rate, burst)
+
+
+def rate_limited(limiter: TokenBucketLimiter):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            wait = limiter.acquire(request.remote_addr or "unknown")
+            if wait > 0:
+                resp = jsonify({"ok": False, "error": "請求過於頻繁，請稍後再試"})
+                resp.status_code = 429
+                resp.headers["Retry-After"] = str(max(1, int(wait + 0.999)))
+                return resp
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
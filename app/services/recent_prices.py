@@ -0,0 +1,106 @@
+# 文件：app/services/recent_prices.py
+#
+# 每個 symbol 一個固定容量的近期價格視窗 (timestamp, price)，存在 NumPy float64 陣列，
+# 由 tick 迴圈 / bus 寫入，啟動時從 price_history 暖機。
+# 緩衝區長度為容量的兩倍，每筆同時寫在 i 與 i + capacity，
+# 因此「最近 n 筆」永遠是一段連續記憶體，可直接切片而不需複製或重組。
+
+import json
+import threading
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from app.models.database import load_recent_prices
+
+CAPACITY = 1440   # 每分鐘一筆約可保存 24 小時
+
+
+class RecentWindow:
+    __slots__ = ("capacity", "ts", "prices", "head", "count", "last_id")
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(2 * capacity, dtype=np.float64)
+        self.prices = np.zeros(2 * capacity, dtype=np.float64)
+        self.head = 0      # 下一筆寫入位置 (0 <= head < capacity)
+        self.count = 0
+        self.last_id = 0   # 已寫入的最大 price_history.id
+
+    def append(self, ts: float, price: float):
+        i = self.head
+        self.ts[i] = self.ts[i + self.capacity] = ts
+        self.prices[i] = self.prices[i + self.capacity] = price
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def last(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """回傳最近 n 筆（由舊到新）的唯讀 view，不複製資料；呼叫端須在持有鎖時用完（之後會被新 tick 覆寫）"""
+        n = max(0, min(n, self.count))
+        end = self.head + self.capacity
+        ts, prices = self.ts[end - n:end], self.prices[end - n:end]
+        ts.flags.writeable = False
+        prices.flags.writeable = False
+        return ts, prices
+
+
+class RecentPrices:
+    def __init__(self, capacity: int = CAPACITY,
+                 loader: Callable[[str, int], list] = load_recent_prices):
+        self.capacity = capacity
+        self._loader = loader
+        self._windows: Dict[str, RecentWindow] = {}
+        self._lock = threading.Lock()
+
+    def _window(self, symbol: str, create: bool = True) -> RecentWindow:
+        """
+        取得 symbol 的視窗，第一次使用時從 DB 暖機。
+        DB 查詢在鎖外進行，不會擋住其他 symbol 的 tick 寫入；
+        唯讀查詢（create=False）若 DB 也沒有資料，不保留空視窗，避免任意 symbol 佔用記憶體。
+        """
+        with self._lock:
+            win = self._windows.get(symbol)
+        if win is not None:
+            return win
+
+        loaded = RecentWindow(self.capacity)
+        for row_id, ts, price in self._loader(symbol, self.capacity):
+            loaded.append(float(ts), float(price))
+            loaded.last_id = row_id
+        with self._lock:
+            # 載入期間可能已有其他執行緒建立視窗，以先建立者為準
+            win = self._windows.get(symbol)
+            if win is None:
+                win = loaded
+                if create or loaded.count:
+                    self._windows[symbol] = win
+        return win
+
+    def warm(self, symbol: str):
+        self._window(symbol)
+
+    def append(self, symbol: str, ts: float, price: float, row_id: int = None):
+        """
+        寫入一筆 tick。row_id 為該筆在 price_history 的 id：
+        tick 先寫入 DB 才廣播，暖機時若已讀到這一筆就不重複寫入。
+        """
+        win = self._window(symbol)
+        with self._lock:
+            if row_id is not None:
+                if row_id <= win.last_id:
+                    return
+                win.last_id = row_id
+            win.append(ts, price)
+
+    def to_json(self, symbol: str, n: int) -> str:
+        """一次編碼整段視窗：兩個陣列各轉一次 list，不逐筆建立 dict"""
+        win = self._window(symbol, create=False)
+        with self._lock:
+            # 在鎖內轉 list，避免編碼途中被新 tick 覆寫最舊的一格
+            ts, prices = win.last(n)
+            ts, prices = ts.tolist(), prices.tolist()
+        return json.dumps({"symbol": symbol, "timestamps": ts, "prices": prices})
+
+
+recent_prices = RecentPrices()
@@ -0,0 +1,130 @@
+# 文件：app/services/response_cache.py
+#
+# 讀取型 API 的回應快取：
+#   - 每個快取名稱（trades、notes、config、news）有一個版本號，資料變動時呼叫 invalidate() 遞增
+#   - 同一版本只序列化、計算 ETag、gzip 壓縮一次，之後的輪詢直接回傳快取的位元組
+#   - If-None-Match 相符時回 304；ETag 由內容雜湊產生，多個 worker 之間一致
+# invalidate 會透過 cluster.bus 廣播，所有 worker 一起失效。
+
+import gzip
+import time
+import hashlib
+import threading
+from functools import wraps
+from typing import Dict, Optional
+
+from flask import request, make_response
+
+from app.services import cluster
+from app.metrics import RESPONSE_CACHE_TOTAL
+
+GZIP_MIN_BYTES = 512
+
+_versions: Dict[str, int] = {}
+_entries: Dict[tuple, "CacheEntry"] = {}
+_lock = threading.Lock()
+
+
+class CacheEntry:
+    __slots__ = ("version", "created", "status", "mimetype", "etag", "body", "gzipped")
+
+    def __init__(self, version, status, mimetype, body):
+        self.version = version
+        self.created = time.monotonic()
+        self.status = status
+        self.mimetype = mimetype
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.gzipped = gzip.compress(body, 6) if len(body) >= GZIP_MIN_BYTES else None
+
+
+def version(name: str) -> int:
+    return _versions.get(name, 0)
+
+
+def _bump(name: str):
+    with _lock:
+        _versions[name] = _versions.get(name, 0) + 1
+        for key in [k for k in _entries if k[0] == name]:
+            del _entries[key]
+
+
+def invalidate(name: str):
+    """遞增 name 的版本；本 worker 立即生效，其他 worker 經由 bus 收到後失效"""
+    _bump(name)
+    cluster.bus.publish("cache_invalidate", {"name": name, "origin": cluster.WORKER_ID})
+
+
+def _on_invalidate(msg):
+    if msg.get("origin") != cluster.WORKER_ID:
+        _bump(msg["name"])
+
+
+cluster.bus.subscribe("cache_invalidate", _on_invalidate)
+
+
+def _on_bus_reconnect():
+    # 斷線期間可能漏掉其他 worker 的失效通知，全部失效最保險
+    with _lock:
+        names = set(_versions) | {key[0] for key in _entries}
+    for name in names:
+        _bump(name)
+
+
+cluster.bus.on_reconnect(_on_bus_reconnect)
+
+
+def _lookup(key, ver, ttl) -> Optional[CacheEntry]:
+    entry = _entries.get(key)
+    if entry is None or entry.version != ver:
+        return None
+    if ttl is not None and time.monotonic() - entry.created > ttl:
+        return None
+    return entry
+
+
+def cached_response(name: str, ttl: float = None):
+    """
+    Flask view decorator。只快取 200 回應；ttl 用於資料來源無法主動通知變動的端點（例如新聞）。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (name, request.query_string)
+            ver = version(name)
+            entry = _lookup(key, ver, ttl)
+            if entry is None:
+                RESPONSE_CACHE_TOTAL.labels(endpoint=name, result="miss").inc()
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200 or resp.direct_passthrough:
+                    return resp
+                entry = CacheEntry(ver, resp.status_code, resp.mimetype, resp.get_data())
+                with _lock:
+                    # 計算期間若版本已遞增，就不要存入過期的內容
+                    if version(name) == ver:
+                        _entries[key] = entry
+            else:
+                RESPONSE_CACHE_TOTAL.labels(endpoint=name, result="hit").inc()
+            return _build_response(name, entry)
+        return wrapper
+    return decorator
+
+
+def _build_response(name: str, entry: CacheEntry):
+    # 強 ETag 必須隨 content-coding 不同：gzip 版本使用獨立的 "<sha>-gz"
+    use_gzip = entry.gzipped is not None and "gzip" in request.accept_encodings
+    etag = f"{entry.etag}-gz" if use_gzip else entry.etag
+    if request.if_none_match.contains_weak(etag):
+        RESPONSE_CACHE_TOTAL.labels(endpoint=name, result="not_modified").inc()
+        resp = make_response("", 304)
+    elif use_gzip:
+        resp = make_response(entry.gzipped, entry.status)
+        resp.headers["Content-Encoding"] = "gzip"
+        resp.mimetype = entry.mimetype
+    else:
+        resp = make_response(entry.body, entry.status)
+        resp.mimetype = entry.mimetype
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept-Encoding")
+    return resp
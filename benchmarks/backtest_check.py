@@ -0,0 +1,94 @@
+# 文件：benchmarks/backtest_check.py
+#
+# 回測正確性與效能檢查：
+#   python -m benchmarks.backtest_check
+#   python -m benchmarks.backtest_check --rows 2000000 --grid 30
+#
+# 以逐筆 Python 迴圈（與 price_broadcast_thread 相同的遲滯判斷）當作參考答案，
+# 比對 backtest.simulate / count_firings / sweep 的向量化結果，並量測 sweep 的耗時。
+# 不需要資料庫：sweep 的 load_prices 換成回傳合成的隨機漫步價格。
+
+import sys
+import time
+import argparse
+
+import numpy as np
+
+
+def reference_firings(prices, low, high):
+    """逐筆重現警報迴圈：high / low 各自寄出後要等另一方向寄出才會重置"""
+    sent_high = sent_low = False
+    events = []
+    for i, price in enumerate(prices):
+        if price > high:
+            if not sent_high:
+                events.append((i, 1))
+                sent_high, sent_low = True, False
+        elif price < low:
+            if not sent_low:
+                events.append((i, -1))
+                sent_low, sent_high = True, False
+    return events
+
+
+def random_walk(rows, seed, start=0.6, step=0.01):
+    rng = np.random.default_rng(seed)
+    return np.maximum(0.01, start + np.cumsum(rng.normal(0, step, rows)))
+
+
+def white_noise(rows, seed, low=0.4, high=0.8):
+    """每個 tick 都可能穿越門檻的最壞情況"""
+    return np.random.default_rng(seed).uniform(low, high, rows)
+
+
+def check_correctness(backtest, cases=200, rows=2000):
+    grid = np.round(np.arange(0.40, 0.81, 0.05), 2)
+    failures = 0
+    for seed in range(cases):
+        prices = random_walk(rows, seed) if seed % 2 == 0 else white_noise(rows, seed)
+        backtest.load_prices = lambda *a, **k: (np.arange(prices.size), prices)
+        swept = {(r["low"], r["high"]): (r["high_firings"], r["low_firings"])
+                 for r in backtest.sweep("check", grid, grid)["grid"]}
+        for (low, high), counts in swept.items():
+            expected = reference_firings(prices, low, high)
+            idx, sides = backtest.simulate(prices, low, high)
+            got = list(zip(idx.tolist(), sides.tolist()))
+            exp_counts = (sum(1 for _, s in expected if s > 0), sum(1 for _, s in expected if s < 0))
+            if got != expected or counts != exp_counts \
+                    or backtest.count_firings(prices, low, high) != exp_counts:
+                failures += 1
+                print(f"不一致 seed={seed} low={low} high={high}: "
+                      f"sweep={counts} simulate={len(got)} reference={exp_counts}")
+    return failures
+
+
+def time_sweep(backtest, prices, grid_size):
+    backtest.load_prices = lambda *a, **k: (np.arange(prices.size), prices)
+    lows = np.linspace(prices.min(), np.median(prices), grid_size)
+    highs = np.linspace(np.median(prices), prices.max(), grid_size)
+    t0 = time.perf_counter()
+    result = backtest.sweep("check", lows, highs)
+    return len(result["grid"]), time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回測向量化結果與逐筆參考實作比對")
+    parser.add_argument("--cases", type=int, default=200, help="隨機價格序列數 (預設 200)")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="效能量測的價格筆數")
+    parser.add_argument("--grid", type=int, default=30, help="效能量測的 lows / highs 各幾個值")
+    args = parser.parse_args(argv)
+
+    from app.services import backtest
+
+    failures = check_correctness(backtest, args.cases)
+    print(f"正確性：{args.cases} 組價格序列，{'全部一致' if not failures else f'{failures} 組不一致'}")
+
+    for name, prices in (("隨機漫步", random_walk(args.rows, 1)),
+                         ("白雜訊", white_noise(args.rows, 1))):
+        pairs, seconds = time_sweep(backtest, prices, args.grid)
+        print(f"效能（{name}）：{pairs} 組門檻 × {args.rows} 筆價格，sweep 耗時 {seconds:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# 文件：benchmarks/bench.py
+#
+# 熱路徑基準測試：
+#   python -m benchmarks.bench --output bench.json
+#   python -m benchmarks.bench --compare benchmarks/baseline.json
+#
+# 所有網路呼叫（Binance、CoinGecko、SMTP）都換成 benchmarks.fakes 的本地替身；
+# 資料庫建立在暫存的 HOME 之下，不會動到 ~/.crypto_alert_system 的正式資料。
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+from benchmarks.fakes import (
+    FakeBinanceClient, FakePriceFeed, FakePriceProvider, fake_send_email, synthetic_trade_rows
+)
+
+
+def _setup_app(workdir: str):
+    """在 import app 之前把 HOME 指到暫存目錄，並替換掉所有對外連線"""
+    os.environ["HOME"] = workdir
+    os.environ.pop("REDIS_URL", None)
+    os.environ.pop("DATABASE_URL", None)   # 固定使用暫存的 SQLite，不碰正式的 PostgreSQL
+
+    import app.services.binance_sync as binance_sync
+    binance_sync.Client = FakeBinanceClient
+    binance_sync.API_KEY = binance_sync.API_SECRET = "bench"
+
+    import run
+    feed = FakePriceFeed()
+    run.get_price = feed
+    # Socket.IO 新連線與 /api/price 經由 price_service 取價，同樣換成本地替身
+    run.price_service.providers = [FakePriceProvider(feed)]
+    run.send_email = fake_send_email
+    return run
+
+
+def measure(fn, iterations: int, warmup: int = 1) -> dict:
+    """重複執行 fn，回傳每次呼叫耗時的統計（毫秒）"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    total_s = sum(samples) / 1000
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "ops_per_sec": iterations / total_s if total_s else None,
+    }
+
+
+# ---------- 個別基準 ----------
+
+def bench_save_price(run, iterations):
+    return measure(lambda: run.save_price("cardano", 0.61), iterations, warmup=10)
+
+
+def _fill_trades(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM trade_history")
+    conn.executemany("""
+      INSERT INTO trade_history (
+        trade_id, order_id, symbol, side,
+        price, quantity, commission,
+        commission_asset, quote_qty,
+        is_maker, trade_time
+      ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, synthetic_trade_rows(rows))
+    conn.commit()
+    conn.close()
+
+
+def bench_api_trades(run, rows, iterations):
+    """未命中快取的成本：每次呼叫前先讓 trades 快取失效"""
+    from app.models.database import DB_PATH
+    _fill_trades(DB_PATH, rows)
+    client = run.app.test_client()
+
+    def call():
+        run.response_cache.invalidate("trades")
+        resp = client.get("/api/trades")
+        assert resp.status_code == 200
+
+    return measure(call, iterations)
+
+
+def bench_api_trades_cached(run, iterations):
+    """儀表板輪詢的成本：帶 If-None-Match 取得 304"""
+    client = run.app.test_client()
+    etag = client.get("/api/trades").headers["ETag"]
+
+    def call():
+        resp = client.get("/api/trades", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+
+    return measure(call, iterations, warmup=10)
+
+
+def bench_sync_trades(run, iterations):
+    stats = measure(run.sync_trades, iterations)
+    stats["trades_per_call"] = FakeBinanceClient.batch_size
+    if stats["ops_per_sec"]:
+        stats["trades_per_sec"] = stats["ops_per_sec"] * FakeBinanceClient.batch_size
+    return stats
+
+
+def bench_alert_eval(run, iterations):
+    feed = FakePriceFeed(start=0.6, step=0.05)
+    run.THRESHOLD_LOW, run.THRESHOLD_HIGH = 0.5, 0.7
+    return measure(lambda: run.check_alerts("cardano", feed("cardano")), iterations, warmup=10)
+
+
+def bench_socket_fanout(run, clients, iterations):
+    conns = [run.socketio.test_client(run.app) for _ in range(clients)]
+    msg = {"symbol": "cardano", "price": 0.61}
+
+    def call():
+        run._on_price_tick(msg)
+
+    try:
+        return measure(call, iterations)
+    finally:
+        for c in conns:
+            c.disconnect()
+
+
+# ---------- 比較模式 ----------
+
+def compare(results: dict, baseline: dict, metric: str, tolerance: float) -> list:
+    """回傳 (名稱, 基準值, 本次值, 變化比例, 是否退步) 列表"""
+    rows = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base or base.get(metric) is None or stats.get(metric) is None:
+            continue
+        change = (stats[metric] - base[metric]) / base[metric] if base[metric] else 0.0
+        rows.append((name, base[metric], stats[metric], change, change > tolerance))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="crypto_alert_system 熱路徑基準測試")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑（預設印到 stdout）")
+    parser.add_argument("--compare", metavar="BASELINE", help="與已存的基準 JSON 比較")
+    parser.add_argument("--metric", default="p50_ms", help="比較用的統計欄位 (預設 p50_ms)")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="容許的退步比例，超過即以 exit code 1 結束 (預設 0.10)")
+    parser.add_argument("--trade-rows", default="10000,100000,1000000",
+                        help="/api/trades 使用的 trade_history 筆數，以逗號分隔")
+    parser.add_argument("--clients", default="10,100,500",
+                        help="Socket.IO fan-out 模擬的 client 數，以逗號分隔")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="輕量基準（save_price、alert）的重複次數")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="crypto_bench_")
+    run = _setup_app(workdir)
+
+    results = {}
+    results["save_price"] = bench_save_price(run, args.iterations)
+    results["alert_eval"] = bench_alert_eval(run, args.iterations)
+    results["sync_trades"] = bench_sync_trades(run, 10)
+    for rows in [int(r) for r in args.trade_rows.split(",") if r]:
+        # 大表每次查詢較久，次數隨筆數遞減
+        iterations = max(3, min(50, 1_000_000 // rows))
+        results[f"api_trades[{rows}]"] = bench_api_trades(run, rows, iterations)
+    results["api_trades_cached"] = bench_api_trades_cached(run, args.iterations)
+    for n in [int(c) for c in args.clients.split(",") if c]:
+        results[f"socket_fanout[{n}]"] = bench_socket_fanout(run, n, 50)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("results", {})
+        regressed = False
+        print(f"\n{'benchmark':<28}{'baseline':>12}{'current':>12}{'change':>10}", file=sys.stderr)
+        for name, base, cur, change, bad in compare(results, baseline, args.metric, args.tolerance):
+            flag = "  REGRESSION" if bad else ""
+            print(f"{name:<28}{base:>12.3f}{cur:>12.3f}{change:>+10.1%}{flag}", file=sys.stderr)
+            regressed = regressed or bad
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
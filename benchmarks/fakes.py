@@ -0,0 +1,96 @@
+# 文件：benchmarks/fakes.py
+#
+# 基準測試用的本地替身：取代 Binance、CoinGecko、SMTP 等網路呼叫，
+# 讓每次量測只反映本機程式碼的成本。
+
+import random
+import itertools
+from datetime import datetime, timedelta
+
+
+class FakeBinanceClient:
+    """模擬 python-binance Client.get_my_trades，每次呼叫回傳一批全新的成交。"""
+
+    _ids = itertools.count(1_000_000_000)
+    batch_size = 1000
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_my_trades(self, symbol, **kwargs):
+        now_ms = int(datetime.now().timestamp() * 1000)
+        trades = []
+        for i in range(self.batch_size):
+            trade_id = next(self._ids)
+            trades.append({
+                "id": trade_id,
+                "orderId": trade_id // 3,
+                "symbol": symbol,
+                "isBuyer": i % 2 == 0,
+                "price": f"{random.uniform(0.3, 0.9):.6f}",
+                "qty": f"{random.uniform(1, 500):.2f}",
+                "commission": "0.001",
+                "commissionAsset": "BNB",
+                "quoteQty": "10.0",
+                "isMaker": i % 3 == 0,
+                "time": now_ms - i * 1000,
+            })
+        return trades
+
+
+class FakePriceFeed:
+    """以隨機漫步產生價格，取代 CoinGecko；會在門檻上下來回穿越以觸發警報邏輯。"""
+
+    def __init__(self, start=0.6, step=0.02, seed=42):
+        self.price = start
+        self.step = step
+        self._rng = random.Random(seed)
+
+    def __call__(self, symbol):
+        self.price = max(0.01, self.price + self._rng.uniform(-self.step, self.step))
+        return self.price
+
+
+class FakePriceProvider:
+    """取代 price_sources 的 CoinGecko / Binance provider，價格來自 FakePriceFeed，不發出 HTTP 請求"""
+
+    name = "fake"
+
+    def __init__(self, feed):
+        from app.services.price_sources import CircuitBreaker
+        self.breaker = CircuitBreaker(self.name)
+        self.feed = feed
+
+    def supports(self, symbol):
+        return True
+
+    def fetch(self, symbol):
+        return self.feed(symbol)
+
+
+def fake_send_email(subject, body):
+    """取代 SMTP，不做任何事"""
+    return None
+
+
+def synthetic_trade_rows(n, symbols=("ADAUSDT", "BTCUSDT", "ETHUSDT"), seed=7):
+    """
+    產生 n 筆 trade_history 欄位 tuple（不含 id），約每 3 筆共用一個 order_id，
+    以模擬 /api/trades 的 GROUP BY order_id 聚合。
+    """
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    for i in range(n):
+        yield (
+            i,                                         # trade_id
+            i // 3,                                    # order_id
+            symbols[(i // 3) % len(symbols)],          # symbol
+            "BUY" if (i // 3) % 2 == 0 else "SELL",    # side
+            rng.uniform(0.3, 0.9),                     # price
+            rng.uniform(1, 500),                       # quantity
+            0.001,                                     # commission
+            "BNB",                                     # commission_asset
+            10.0,                                      # quote_qty
+            i % 2,                                     # is_maker
+            (start + timedelta(minutes=i)).isoformat(sep=' '),
+        )
@@ -104,11 +104,31 @@ export default function ToolsPage() {
     const htmlContent = codeRef.current.innerHTML;
     const method = currentNote.id ? "PUT" : "POST";
     const url = currentNote.id ? `/api/notes/${currentNote.id}` : "/api/notes";
-    await fetch(url, {
+    const note = { ...currentNote, code: htmlContent };
+    const res = await fetch(url, {
       method,
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ ...currentNote, code: htmlContent }),
+      body: JSON.stringify(note),
     });
+    if (res.status === 409) {
+      // 保留編輯中的內容，由使用者決定是否以此版本覆寫
+      const data = await res.json();
+      loadNotes();
+      if (window.confirm("此筆記已在其他分頁被修改。\n按「確定」後再按一次儲存，即以目前編輯的內容覆寫最新版本；\n按「取消」則保留編輯器內容，可先複製後再重新開啟。")) {
+        setCurrentNote({ ...note, version: data.version });
+      } else {
+        setCurrentNote(note);
+      }
+      return;
+    }
+    if (res.status === 429) {
+      alert("儲存太頻繁，請稍後再試。");
+      return;
+    }
+    if (!res.ok) {
+      alert("儲存失敗，請稍後再試。");
+      return;
+    }
     setShow(false);
     loadNotes();
   };
@@ -1,27 +1,43 @@
 print("📢 run.py 被執行了！")
 import os
 import json
-import threading
+import math
 import time
-import sqlite3
 import logging
 import smtplib
 from email.mime.text import MIMEText
 from datetime import datetime  # 新增 datetime 的匯入
-from flask import Flask, send_from_directory, request, jsonify, abort, Response
+from flask import Flask, send_from_directory, request, jsonify, abort, Response, g
 from flask_cors import CORS
 from flask_socketio import SocketIO
 import requests
 
-from app.models.database import init_db, save_price, DB_PATH
-from app.services.price_tracker import get_price
+from app.models.database import init_db, save_price, claim_alert, backend
+from app.services.price_tracker import get_price, purge_old_prices
+from app.services.archive import archive_trades
+from app.services.price_sources import price_service, CACHE_MAX_AGE
+from app.services.recent_prices import recent_prices
 from app.services.binance_sync import sync_trades
 from app.services.news_fetcher import fetch_daily_news
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from app.metrics import (
+    PRICE_SUCCESS, PRICE_FAILURE, PRICE_DURATION, PRICE_EMIT,
+    DB_DURATION, HTTP_DURATION, SOCKET_CLIENTS, SOCKET_EMIT_DURATION,
+    EMAIL_SEND_DURATION, EMAIL_SEND_TOTAL, JOB_DURATION, JOB_LAST_SUCCESS,
+)
 from base64 import b64decode
 import uuid
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 from app.models import notes as notes_model
+from app.services import cluster
+from app.services import profiling
+from app.services import backtest
+from app.services import indicators
+from app.services.portfolio import portfolio
+from app.services import response_cache
+from app.services.response_cache import cached_response
+from app.services.rate_limit import make_limiter, rate_limited
 
 IMAGE_DIR = "/opt/crypto_alert_system/images"
 os.makedirs(IMAGE_DIR, exist_ok=True)
@@ -31,28 +47,6 @@ os.makedirs(IMAGE_DIR, exist_ok=True)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- Prometheus 指標 ---
-PRICE_SUCCESS = Counter(
-    'price_fetch_success_total',
-    '價格抓取成功次數',
-    ['symbol']
-)
-PRICE_FAILURE = Counter(
-    'price_fetch_failure_total',
-    '價格抓取失敗次數',
-    ['symbol']
-)
-PRICE_DURATION = Histogram(
-    'price_fetch_duration_seconds',
-    '價格抓取耗時 (秒)',
-    ['symbol']
-)
-PRICE_EMIT = Counter(
-    'price_emit_total',
-    '推送價格更新次數',
-    ['symbol']
-)
-
 # === 1. 讀取 config.json ===
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 with open(os.path.join(BASE_DIR, "config.json"), "r") as f:
@@ -61,6 +55,7 @@ with open(os.path.join(BASE_DIR, "config.json"), "r") as f:
 SYMBOL = cfg.get("symbol", "cardano")
 THRESHOLD_LOW = cfg.get("threshold_low", 0.5)
 THRESHOLD_HIGH = cfg.get("threshold_high", 0.8)
+portfolio.price_ids.update(cfg.get("price_ids", {}))
 
 # === Email 設定 & 發信函式 ===
 EMAIL_SENDER   = cfg['email']['sender']
@@ -74,11 +69,14 @@ def send_email(subject, body):
     msg['To']      = EMAIL_RECEIVER
 
     try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.send_message(msg)
+        with EMAIL_SEND_DURATION.time():
+            with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
+                server.login(EMAIL_SENDER, EMAIL_PASSWORD)
+                server.send_message(msg)
+        EMAIL_SEND_TOTAL.labels(result="success").inc()
         logger.info(f"[notifier] Email 已發送: {subject}")
     except Exception as e:
+        EMAIL_SEND_TOTAL.labels(result="failure").inc()
         logger.error(f"[notifier] 發送 Email 失敗: {e}")
 
 # === 2. 建立 Flask + SocketIO ===
@@ -87,12 +85,79 @@ app = Flask(
     static_folder="frontend/build",
     static_url_path=""
 )
+# 在 nginx 等反向代理後面時，設定 TRUSTED_PROXIES 為代理層數，
+# 才會以 X-Forwarded-For 的 client IP 作為 request.remote_addr（限流依此分 bucket）
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES,
+                            x_host=TRUSTED_PROXIES)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# === 多 worker：leader 發布、每個 worker 推送給自己的 Socket.IO 連線 ===
+def _on_price_tick(msg):
+    price_service.remember(msg["symbol"], msg["price"])
+    recent_prices.append(msg["symbol"], msg.get("ts") or time.time(), msg["price"], msg.get("id"))
+    PRICE_EMIT.labels(symbol=msg["symbol"]).inc()
+    with SOCKET_EMIT_DURATION.labels(event="price_update").time():
+        socketio.emit("price_update", msg)
+
+# 每個 worker 保留最近一次的指標快照，供新連線與 /api/indicators 使用
+_latest_indicators = {}
+
+def _on_indicator_tick(msg):
+    _latest_indicators[msg["symbol"]] = msg
+    with SOCKET_EMIT_DURATION.labels(event="indicator_update").time():
+        socketio.emit("indicator_update", msg)
+
+_latest_portfolio = {}
+
+def _on_portfolio_tick(msg):
+    _latest_portfolio.update(msg)
+    with SOCKET_EMIT_DURATION.labels(event="portfolio_update").time():
+        socketio.emit("portfolio_update", msg)
+
+def _on_config_change(msg):
+    global SYMBOL, THRESHOLD_LOW, THRESHOLD_HIGH
+    SYMBOL = msg["symbol"]
+    THRESHOLD_LOW = msg["threshold_low"]
+    THRESHOLD_HIGH = msg["threshold_high"]
+    cfg.update(msg)
+
+cluster.bus.subscribe("price_update", _on_price_tick)
+cluster.bus.subscribe("indicators", _on_indicator_tick)
+cluster.bus.subscribe("portfolio", _on_portfolio_tick)
+cluster.bus.subscribe("config", _on_config_change)
+
+# === HTTP 延遲量測（依 route 規則分組） ===
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    profiling.start_trace(f"{request.method} {route}")
+
+@app.after_request
+def _record_latency(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_DURATION.labels(
+            method=request.method,
+            route=route,
+            status=str(response.status_code)
+        ).observe(time.perf_counter() - start)
+    return response
+
+@app.teardown_request
+def _finish_trace(exc):
+    # teardown 在 view 丟出例外時也會執行，失敗的慢請求同樣會被記錄
+    profiling.finish_trace(failed=exc is not None)
+
 # === 3. 初始化 DB 與同步首次交易 ===
 init_db()
 sync_trades()
+recent_prices.warm(SYMBOL)
+indicators.engine.warm(SYMBOL)
 
 # === 4. SPA 路由 fallback ===
 @app.route("/", defaults={"path": ""})
@@ -106,15 +171,14 @@ def serve(path):
 # === 5. API Endpoints ===
 @app.route("/api/price")
 def api_price():
-    with PRICE_DURATION.labels(symbol=SYMBOL).time():
-        try:
-            price = get_price(SYMBOL)
-            PRICE_SUCCESS.labels(symbol=SYMBOL).inc()
-        except Exception as e:
-            PRICE_FAILURE.labels(symbol=SYMBOL).inc()
-            logger.error(f"[api_price] get_price error: {e}")
-            return jsonify({"symbol": SYMBOL, "price": None}), 200
-    return jsonify({"symbol": SYMBOL, "price": price})
+    # 只讀 tick 迴圈維護的快取；上游的成功率與延遲由 tick 迴圈與 price_source_* 指標記錄
+    price, age = price_service.cached_price(SYMBOL)
+    return jsonify({
+        "symbol": SYMBOL,
+        "price": price,
+        "age": round(age, 1) if age is not None else None,
+        "stale": age is None or age > CACHE_MAX_AGE,
+    })
 
 @app.route("/api/set-threshold", methods=["POST"])
 def api_set_threshold():
@@ -132,22 +196,34 @@ def api_set_threshold():
     })
     with open(os.path.join(BASE_DIR, "config.json"), "w") as f:
         json.dump(cfg, f, indent=2)
+
+    # 通知其他 worker（含 leader 的價格迴圈）套用新設定
+    cluster.bus.publish("config", {
+        "symbol":         SYMBOL,
+        "threshold_low":  THRESHOLD_LOW,
+        "threshold_high": THRESHOLD_HIGH
+    })
+    response_cache.invalidate("config")
     return jsonify({"ok": True})
 
+def _query_trades():
+    # 同一訂單的多筆成交合併為一列，價格取數量加權平均（PostgreSQL 不允許未聚合的欄位）
+    with backend.connect() as conn:
+        return backend.fetchall(backend.execute(conn, """
+          SELECT order_id, symbol, side,
+                 SUM(price * quantity) / NULLIF(SUM(quantity), 0) AS price,
+                 SUM(quantity) AS quantity,
+                 MIN(trade_time) AS trade_time
+          FROM trade_history
+          GROUP BY order_id, symbol, side
+          ORDER BY trade_time ASC
+        """))
+
 @app.route("/api/trades")
+@cached_response("trades")
 def api_trades():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-      SELECT order_id, symbol, side, price,
-             SUM(quantity) AS quantity,
-             MIN(trade_time) AS trade_time
-      FROM trade_history
-      GROUP BY order_id
-      ORDER BY datetime(trade_time) ASC
-    """)
-    records = cur.fetchall()
-    conn.close()
+    with DB_DURATION.labels(operation="list_trades").time(), profiling.span("query"):
+        records = _query_trades()
 
     trades = []
     last_buy = {}
@@ -166,12 +242,15 @@ def api_trades():
             "quantity": qty,
             "profit_pct": f"{profit_pct:+.2f}%" if profit_pct is not None else "-"
         })
-    return jsonify(list(reversed(trades))[:50])
+    with profiling.span("serialize"):
+        return jsonify(list(reversed(trades))[:50])
 
 @app.route("/api/news")
+@cached_response("news", ttl=300)
 def api_news():
     # 原 fetch_daily_news() 返回 {'blockchain': [...], 'economy': [...], 'price': ...}
-    d = fetch_daily_news()
+    with profiling.span("fetch"):
+        d = fetch_daily_news()
 
     # 合并两类新闻
     combined = d.get("blockchain", []) + d.get("economy", [])
@@ -203,16 +282,20 @@ def api_news():
 
 # Notes CRUD Same...
 @app.route("/api/notes", methods=["GET"])
+@cached_response("notes")
 def list_notes():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("SELECT * FROM notes ORDER BY updated_at DESC").fetchall()
-    conn.close()
-    return jsonify([dict(r) for r in rows])
+    with DB_DURATION.labels(operation="list_notes").time(), profiling.span("query"):
+        with backend.connect() as conn:
+            rows = backend.fetch_dicts(
+                backend.execute(conn, "SELECT * FROM notes ORDER BY updated_at DESC")
+            )
+    with profiling.span("serialize"):
+        return jsonify(rows)
 
 # ... update, delete omitted for brevity
 
 @app.route("/api/config")
+@cached_response("config")
 def api_config():
     return jsonify({
         "symbol": cfg.get("symbol", SYMBOL),
@@ -220,67 +303,223 @@ def api_config():
         "threshold_high": cfg.get("threshold_high", THRESHOLD_HIGH)
     })
 
+@app.route("/api/indicators")
+def api_indicators():
+    symbol = request.args.get("symbol", SYMBOL)
+    return jsonify(_latest_indicators.get(symbol) or {"symbol": symbol})
+
+@app.route("/api/portfolio")
+def api_portfolio():
+    return jsonify(_latest_portfolio or portfolio.snapshot())
+
+@app.route("/api/price/recent")
+def api_price_recent():
+    """近期價格（記憶體視窗），n 預設 60、上限為視窗容量"""
+    symbol = request.args.get("symbol", SYMBOL)
+    n = request.args.get("n", 60, type=int)
+    return Response(recent_prices.to_json(symbol, n), mimetype="application/json")
+
+@app.route("/api/price/sources")
+def api_price_sources():
+    return jsonify(price_service.health())
+
+def _time_range():
+    """讀取並驗證 start / end 查詢參數，格式錯誤丟 ValueError"""
+    return (backtest.parse_time(request.args.get("start")),
+            backtest.parse_time(request.args.get("end")))
+
+@app.route("/api/price/history")
+def api_price_history():
+    """
+    價格歷史（含已歸檔的 Parquet），適合長區間查詢；
+    超過 max_points 時等距抽樣以控制回應大小
+    """
+    symbol = request.args.get("symbol", SYMBOL)
+    max_points = max(1, request.args.get("max_points", 2000, type=int))
+    try:
+        start, end = _time_range()
+    except ValueError as e:
+        return jsonify({"error": f"無法解析時間範圍: {e}"}), 400
+    ts, prices = backtest.load_prices(symbol, start=start, end=end)
+    step = max(1, -(-ts.size // max_points))
+    return jsonify({
+        "symbol": symbol,
+        "rows": int(ts.size),
+        "timestamps": ts[::step].tolist(),
+        "prices": prices[::step].tolist()
+    })
+
+@app.route("/api/backtest")
+def api_backtest():
+    """以歷史價格回測單一組門檻，預設使用目前設定"""
+    symbol = request.args.get("symbol", SYMBOL)
+    low = request.args.get("low", THRESHOLD_LOW, type=float)
+    high = request.args.get("high", THRESHOLD_HIGH, type=float)
+    if not (math.isfinite(low) and math.isfinite(high)):
+        return jsonify({"error": "low / high 必須是有限數值"}), 400
+    if low >= high:
+        return jsonify({"error": "low 必須小於 high"}), 400
+    try:
+        start, end = _time_range()
+    except ValueError as e:
+        return jsonify({"error": f"無法解析時間範圍: {e}"}), 400
+    result = backtest.replay(
+        symbol, low, high,
+        start=start,
+        end=end,
+        limit=request.args.get("limit", 500, type=int)
+    )
+    return jsonify(result)
+
+@app.route("/api/backtest/sweep")
+def api_backtest_sweep():
+    """掃描 lows × highs 門檻組合，例如 ?lows=0.4:0.55:0.01&highs=0.6:0.8:0.01"""
+    symbol = request.args.get("symbol", SYMBOL)
+    try:
+        lows = backtest.parse_range(request.args.get("lows", str(THRESHOLD_LOW)))
+        highs = backtest.parse_range(request.args.get("highs", str(THRESHOLD_HIGH)))
+    except ValueError as e:
+        return jsonify({"error": f"無法解析門檻範圍: {e}"}), 400
+    if lows.size * highs.size > backtest.MAX_SWEEP_PAIRS:
+        return jsonify({"error": f"門檻組合過多（上限 {backtest.MAX_SWEEP_PAIRS}）"}), 400
+    try:
+        start, end = _time_range()
+    except ValueError as e:
+        return jsonify({"error": f"無法解析時間範圍: {e}"}), 400
+    result = backtest.sweep(symbol, lows, highs, start=start, end=end)
+    return jsonify(result)
+
 @app.route("/metrics")
 def metrics():
     data = generate_latest()
     return Response(data, mimetype=CONTENT_TYPE_LATEST)
 
+@app.route("/debug/profile")
+def debug_profile():
+    """取樣 N 秒所有執行緒的 stack，回傳 folded 格式（需 PROFILING_ENABLED=1）"""
+    if not profiling.PROFILING_ENABLED:
+        abort(404)
+    seconds = request.args.get("seconds", 10, type=float)
+    interval = request.args.get("interval", 0.005, type=float)
+    try:
+        folded = profiling.sample_stacks(seconds, max(interval, 0.001))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return Response(folded, mimetype="text/plain")
+
 @socketio.on("connect")
 def on_connect():
-    try:
-        price = get_price(SYMBOL)
+    SOCKET_CLIENTS.inc()
+    price, age = price_service.cached_price(SYMBOL)
+    if price is not None:
         socketio.emit(
             "price_update",
-            {"symbol": SYMBOL, "price": price},
+            {"symbol": SYMBOL, "price": price, "stale": age > CACHE_MAX_AGE},
             to=request.sid
         )
-    except Exception as e:
-        logger.error(f"[on_connect] 推送初始價格失敗: {e}")
+    snap = _latest_indicators.get(SYMBOL)
+    if snap:
+        socketio.emit("indicator_update", snap, to=request.sid)
 
+@socketio.on("disconnect")
+def on_disconnect():
+    SOCKET_CLIENTS.dec()
+
+
+def check_alerts(symbol, price):
+    """依門檻判斷是否寄出警報；high / low 具遲滯性，穿越一次只寄一封"""
+    if price > THRESHOLD_HIGH and claim_alert(symbol, "high"):
+        send_email(
+            f"{symbol.upper()} 價格高於 {THRESHOLD_HIGH}",
+            f"目前價格 ${price:.4f}，請注意可能逢高。"
+        )
+    elif price < THRESHOLD_LOW and claim_alert(symbol, "low"):
+        send_email(
+            f"{symbol.upper()} 價格低於 {THRESHOLD_LOW}",
+            f"目前價格 ${price:.4f}，可考慮加倉。"
+        )
+
+def check_indicator_alerts(symbol, snap):
+    """
+    指標警報，規則設定於 config.json 的 indicator_alerts，例如：
+      [{"indicator": "rsi", "low": 30, "high": 70}]
+    與價格警報相同的遲滯邏輯，狀態以 "<symbol>:<indicator>" 存在 alert_state。
+    """
+    for rule in cfg.get("indicator_alerts", []):
+        name = rule.get("indicator")
+        value = snap.get(name)
+        if value is None:
+            continue
+        key = f"{symbol}:{name}"
+        high, low = rule.get("high"), rule.get("low")
+        if high is not None and value > high and claim_alert(key, "high"):
+            send_email(
+                f"{symbol.upper()} {name.upper()} 高於 {high}",
+                f"目前 {name} = {value:.4f}，價格 ${snap['price']:.4f}。"
+            )
+        elif low is not None and value < low and claim_alert(key, "low"):
+            send_email(
+                f"{symbol.upper()} {name.upper()} 低於 {low}",
+                f"目前 {name} = {value:.4f}，價格 ${snap['price']:.4f}。"
+            )
 
 def price_broadcast_thread():
-    alert_high_sent = False
-    alert_low_sent = False
+    # 警報旗標存在 DB 的 alert_state，leader 換手後也不會重複發信
     while True:
+        if not cluster.is_leader():
+            time.sleep(5)
+            continue
+        profiling.start_trace("price_broadcast")
         try:
-            with PRICE_DURATION.labels(symbol=SYMBOL).time():
+            with PRICE_DURATION.labels(symbol=SYMBOL).time(), profiling.span("fetch"):
                 price = get_price(SYMBOL)
             PRICE_SUCCESS.labels(symbol=SYMBOL).inc()
         except Exception as e:
             PRICE_FAILURE.labels(symbol=SYMBOL).inc()
             logger.error(f"[broadcast] get_price error: {e}")
+            profiling.finish_trace(failed=True)
             time.sleep(30)
             continue
 
-        if price is not None:
-            save_price(SYMBOL, price)
-            PRICE_EMIT.labels(symbol=SYMBOL).inc()
-            socketio.emit("price_update", { "symbol": SYMBOL, "price": price })
-
-            if price > THRESHOLD_HIGH and not alert_high_sent:
-                send_email(
-                    f"{SYMBOL.upper()} 價格高於 {THRESHOLD_HIGH}",
-                    f"目前價格 ${price:.4f}，請注意可能逢高。"
-                )
-                alert_high_sent = True
-                alert_low_sent = False
-            elif price < THRESHOLD_LOW and not alert_low_sent:
-                send_email(
-                    f"{SYMBOL.upper()} 價格低於 {THRESHOLD_LOW}",
-                    f"目前價格 ${price:.4f}，可考慮加倉。"
-                )
-                alert_low_sent = True
-                alert_high_sent = False
+        try:
+            if price is not None:
+                with profiling.span("save"):
+                    row_id = save_price(SYMBOL, price)
+                with profiling.span("indicators"):
+                    snap = indicators.engine.update(SYMBOL, price, row_id)
+                    valuation = portfolio.on_price(SYMBOL, price)
+                with profiling.span("emit"):
+                    cluster.bus.publish("price_update", {
+                        "symbol": SYMBOL, "price": price, "ts": time.time(), "id": row_id
+                    })
+                    cluster.bus.publish("indicators", snap)
+                    cluster.bus.publish("portfolio", valuation)
+                with profiling.span("alert"):
+                    check_alerts(SYMBOL, price)
+                    check_indicator_alerts(SYMBOL, snap)
+            JOB_LAST_SUCCESS.labels(job="price_broadcast").set_to_current_time()
+        except Exception as e:
+            # 任何一步（DB 被鎖、連線池逾時、bus 斷線）失敗都只略過這個 tick，
+            # 不能讓執行緒結束：leader 鎖仍會續約，其他 worker 不會接手
+            logger.error(f"[broadcast] 處理價格失敗，略過本次 tick: {e}")
+            profiling.finish_trace(failed=True)
+            time.sleep(60)
+            continue
 
+        profiling.finish_trace()
         time.sleep(60)
 
 def scheduled_news_fetch():
     while True:
         now = datetime.now()
-        if now.hour == 8 and now.minute == 0:
+        if cluster.is_leader() and now.hour == 8 and now.minute == 0:
             try:
                 logger.info("⏰ 開始每日新聞抓取")
-                fetch_daily_news()
+                with JOB_DURATION.labels(job="news_fetch").time(), \
+                        profiling.traced("news_fetch", profiling.JOB_SLOW_THRESHOLD_MS):
+                    fetch_daily_news()
+                response_cache.invalidate("news")
+                JOB_LAST_SUCCESS.labels(job="news_fetch").set_to_current_time()
             except Exception as e:
                 logger.error(f"[news_fetch] 抓取新聞失敗: {e}")
             time.sleep(60)  # 避免重複執行
@@ -288,15 +527,49 @@ def scheduled_news_fetch():
 
 def scheduled_trade_sync():
     while True:
+        if not cluster.is_leader():
+            time.sleep(5)
+            continue
         try:
             logger.info("🔄 同步 Binance 交易紀錄")
-            sync_trades()
+            with JOB_DURATION.labels(job="trade_sync").time(), \
+                    profiling.traced("trade_sync", profiling.JOB_SLOW_THRESHOLD_MS):
+                with profiling.span("sync"):
+                    sync_trades()
+                with profiling.span("portfolio"):
+                    refreshed = portfolio.refresh()
+                if refreshed:
+                    response_cache.invalidate("trades")
+            JOB_LAST_SUCCESS.labels(job="trade_sync").set_to_current_time()
         except Exception as e:
             logger.error(f"[sync_trades] 同步交易紀錄失敗: {e}")
         time.sleep(3600)  # 每小時抓一次
 
+def scheduled_archive():
+    """每日 03:00 將過期價格歸檔後刪除，並匯出新成交到 Parquet"""
+    while True:
+        now = datetime.now()
+        if cluster.is_leader() and now.hour == 3 and now.minute == 0:
+            try:
+                logger.info("🗄️ 開始歸檔歷史資料")
+                with JOB_DURATION.labels(job="archive").time(), \
+                        profiling.traced("archive", profiling.JOB_SLOW_THRESHOLD_MS):
+                    with profiling.span("prices"):
+                        purge_old_prices(days=30)
+                    with profiling.span("trades"):
+                        archive_trades()
+                JOB_LAST_SUCCESS.labels(job="archive").set_to_current_time()
+            except Exception as e:
+                logger.error(f"[archive] 歸檔失敗: {e}")
+            time.sleep(60)  # 避免重複執行
+        time.sleep(30)
+
 # === 6. 圖片上傳與存取 ===
+# 筆記 / 圖片寫入限流：每個 IP 每秒 2 次，瞬間最多 10 次（多 worker 時共用）
+notes_write_limiter = make_limiter(rate=2, burst=10, name="notes_write")
+
 @app.route("/api/upload_image", methods=["POST"])
+@rate_limited(notes_write_limiter)
 def upload_image():
     data = request.get_json()
     base64_data = data.get("image")
@@ -316,30 +589,51 @@ def upload_image():
         return jsonify({"error": "Failed to save image"}), 500
 
 @app.route("/api/notes", methods=["POST"])
+@rate_limited(notes_write_limiter)
 def create_note():
     data = request.get_json()
+    data.pop("id", None)
     try:
-        note_id = notes_model.save_note(data)
-        return jsonify({"ok": True, "id": note_id})
+        note = notes_model.save_note(data)
+        response_cache.invalidate("notes")
+        return jsonify({"ok": True, "id": note["id"], "version": note["version"]})
     except Exception as e:
         logger.error(f"[create_note] 儲存筆記失敗: {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
 @app.route("/api/notes/<int:note_id>", methods=["PUT"])
+@rate_limited(notes_write_limiter)
 def update_note(note_id):
-    data = request.get_json()
+    data = request.get_json() or {}
     data["id"] = note_id
+    if data.get("version") is None:
+        # 必須帶讀到的版本才能更新，避免無條件覆寫其他分頁的修改
+        return jsonify({"ok": False, "error": "缺少 version，請重新載入筆記後再儲存"}), 428
     try:
-        notes_model.save_note(data)
-        return jsonify({"ok": True})
+        version = data["version"]
+        if isinstance(version, bool) or (isinstance(version, float) and not version.is_integer()):
+            raise TypeError
+        data["version"] = int(version)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "version 必須是整數"}), 400
+    try:
+        note = notes_model.save_note(data)
+        response_cache.invalidate("notes")
+        return jsonify({"ok": True, "version": note["version"]})
+    except notes_model.NoteConflict as e:
+        return jsonify({"ok": False, "error": str(e), "version": e.current_version}), 409
+    except LookupError as e:
+        return jsonify({"ok": False, "error": str(e)}), 404
     except Exception as e:
         logger.error(f"[update_note] 更新筆記失敗: {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
 @app.route("/api/notes/<int:note_id>", methods=["DELETE"])
+@rate_limited(notes_write_limiter)
 def delete_note(note_id):
     try:
         notes_model.delete_note(note_id)
+        response_cache.invalidate("notes")
         return jsonify({"ok": True})
     except Exception as e:
         logger.error(f"[delete_note] 刪除筆記失敗: {e}")
@@ -351,20 +645,14 @@ if __name__ == "__main__":
     init_db()
     sync_trades()
     
-    # 即時價格推送
-    thread = threading.Thread(target=price_broadcast_thread)
-    thread.daemon = True
-    thread.start()
-
-    # 排程任務
-    news_thread = threading.Thread(target=scheduled_news_fetch)
-    news_thread.daemon = True
-    news_thread.start()
-
-    trade_thread = threading.Thread(target=scheduled_trade_sync)
-    trade_thread.daemon = True
-    trade_thread.start()
-
-    # 啟動 Flask Server
-    socketio.run(app, host="0.0.0.0", port=5000)
+    # 即時價格推送與排程任務：只有被選為 leader 的 process 會執行
+    cluster.run_when_leader([
+        price_broadcast_thread,
+        scheduled_news_fetch,
+        scheduled_trade_sync,
+        scheduled_archive,
+    ])
+
+    # 啟動 Flask Server（多 worker 時以 PORT 區分各 process）
+    socketio.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "5000")))
 